@@ -0,0 +1,45 @@
+import hashlib
+
+import numpy as np
+
+from .lru import LRUCache
+from .tiered import TieredCache
+
+def content_key(text: str, model_name: str, kind: str = "query") -> str:
+    digest = hashlib.sha256()
+    for part in (model_name, kind, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class EmbeddingCache(TieredCache):
+    """Content-addressed vector cache: in-memory LRU with an optional SQLite tier."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        disk_path: str = None,
+        disk_max_entries: int = None,
+    ):
+        super().__init__(
+            LRUCache(
+                max_entries=max_entries,
+                max_bytes=max_bytes,
+                sizeof=lambda item: item.nbytes if isinstance(item, np.ndarray) else len(item),
+            ),
+            disk_path=disk_path,
+            table="embeddings",
+            disk_max_entries=disk_max_entries,
+        )
+
+    def encode(self, value: np.ndarray) -> bytes:
+        return value.tobytes()
+
+    def decode(self, raw: bytes) -> np.ndarray:
+        return np.frombuffer(raw, dtype=np.float32)
+
+    def prepare(self, value) -> np.ndarray:
+        vector = np.asarray(value, dtype=np.float32).ravel()
+        vector.setflags(write=False)
+        return vector
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+INDEX_VERSION = 1
+
+def description_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class LabelEmbeddingCache:
+    """Normalized label vectors persisted per embedding model.
+
+    Rows are stored as a float32 ``.npy`` file next to a JSON index of
+    description hashes, so a warm start can memory-map the matrix instead
+    of calling the embedding API.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name).strip("_") or "default"
+        self.model_name = model_name
+        self.matrix_path = os.path.join(cache_dir, f"{slug}.npy")
+        self.index_path = os.path.join(cache_dir, f"{slug}.json")
+
+    def load(self) -> tuple[list[str], np.ndarray]:
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.index_path):
+                print(f"Ignoring unreadable label embedding cache: {e}")
+            return [], np.empty((0, 0), dtype=np.float32)
+
+        hashes = index.get("hashes", [])
+        if (
+            index.get("version") != INDEX_VERSION
+            or index.get("model") != self.model_name
+            or matrix.dtype != np.float32
+            or matrix.ndim != 2
+            or matrix.shape[0] != len(hashes)
+        ):
+            return [], np.empty((0, 0), dtype=np.float32)
+        return hashes, matrix
+
+    def save(self, hashes: list[str], matrix: np.ndarray):
+        os.makedirs(os.path.dirname(self.matrix_path), exist_ok=True)
+        
+        tmp_matrix_path = f"{self.matrix_path}.{os.getpid()}.tmp"
+        tmp_index_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_matrix_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(tmp_index_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "model": self.model_name, "hashes": hashes}, f)
+        
+        os.replace(tmp_matrix_path, self.matrix_path)
+        os.replace(tmp_index_path, self.index_path)
+
+    def get_or_embed(self, texts: list[str], embed_fn, normalize_fn) -> np.ndarray:
+        hashes = [description_hash(text) for text in texts]
+        cached_hashes, cached_matrix = self.load()
+
+        if cached_hashes == hashes:
+            return cached_matrix
+
+        row_of = {h: i for i, h in enumerate(cached_hashes)}
+        missing = [i for i, h in enumerate(hashes) if h not in row_of]
+        
+        new_rows = np.empty((0, cached_matrix.shape[1]), dtype=np.float32)
+        if missing:
+            print(f"Embedding {len(missing)} of {len(texts)} label descriptions for {self.model_name}.")
+            new_rows = normalize_fn(embed_fn([texts[i] for i in missing]))
+            if cached_hashes and new_rows.shape[1] != cached_matrix.shape[1]:
+                row_of = {}
+                missing = list(range(len(texts)))
+                new_rows = normalize_fn(embed_fn(texts))
+
+        matrix = np.empty((len(texts), new_rows.shape[1]), dtype=np.float32)
+        new_row_of = {i: j for j, i in enumerate(missing)}
+        for i, h in enumerate(hashes):
+            if i in new_row_of:
+                matrix[i] = new_rows[new_row_of[i]]
+            else:
+                matrix[i] = cached_matrix[row_of[h]]
+
+        try:
+            self.save(hashes, matrix)
+        except OSError as e:
+            print(f"Could not persist label embedding cache: {e}")
+        
+        return matrix
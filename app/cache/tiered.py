@@ -0,0 +1,125 @@
+import json
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+
+from .lru import LRUCache
+from .sqlite_store import SQLiteStore
+
+class TieredCache:
+    """In-memory LRU in front of an optional persistent SQLite tier.
+
+    Subclasses override ``encode``/``decode`` to control how values are
+    stored on disk.
+    """
+
+    def __init__(
+        self,
+        memory: LRUCache,
+        disk_path: str = None,
+        table: str = "cache",
+        disk_max_entries: int = None,
+        ttl_seconds: float = None,
+    ):
+        self.memory = memory
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.table = table
+        self.disk_max_entries = disk_max_entries
+        self.disk_hits = 0
+        self._disk = None
+        self._disk_lock = threading.Lock()
+
+    @property
+    def disk(self) -> SQLiteStore:
+        # Opened on first use so that importing a module that defines a cache
+        # does not create files.
+        if self._disk is None and self.disk_path:
+            with self._disk_lock:
+                if self._disk is None:
+                    self._disk = SQLiteStore(self.disk_path, table=self.table, max_entries=self.disk_max_entries)
+        return self._disk
+
+    def encode(self, value) -> bytes:
+        return value.encode("utf-8")
+
+    def decode(self, raw: bytes):
+        return bytes(raw).decode("utf-8")
+
+    def prepare(self, value):
+        return value
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None or not self.disk_path:
+            return value
+        return self._disk_get(key)
+
+    def set(self, key: str, value):
+        value = self.prepare(value)
+        self.memory.set(key, value, ttl_seconds=self.ttl_seconds)
+        if self.disk_path:
+            self._disk_set(key, value)
+        return value
+
+    async def aget(self, key: str):
+        """Like ``get``, but reads the disk tier in the threadpool."""
+        value = self.memory.get(key)
+        if value is not None or not self.disk_path:
+            return value
+        return await run_in_threadpool(self._disk_get, key)
+
+    async def aget_many(self, keys: list[str]) -> list:
+        """Like ``aget`` for several keys; disk misses share one threadpool hop."""
+        values = [self.memory.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing or not self.disk_path:
+            return values
+        
+        found = await run_in_threadpool(lambda: [self._disk_get(keys[i]) for i in missing])
+        for i, value in zip(missing, found):
+            values[i] = value
+        return values
+
+    async def aset(self, key: str, value):
+        """Like ``set``, but writes the disk tier in the threadpool."""
+        value = self.prepare(value)
+        self.memory.set(key, value, ttl_seconds=self.ttl_seconds)
+        if self.disk_path:
+            await run_in_threadpool(self._disk_set, key, value)
+        return value
+
+    def _disk_get(self, key: str):
+        try:
+            raw = self.disk.get(key)
+        except Exception as e:
+            print(f"Cache disk read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        
+        value = self.decode(raw)
+        self.disk_hits += 1
+        self.memory.set(key, value, ttl_seconds=self.ttl_seconds)
+        return value
+
+    def _disk_set(self, key: str, value):
+        try:
+            self.disk.set(key, self.encode(value), ttl_seconds=self.ttl_seconds)
+        except Exception as e:
+            print(f"Cache disk write failed: {e}")
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats["disk_enabled"] = bool(self.disk_path)
+        stats["disk_hits"] = self.disk_hits
+        return stats
+
+class JSONTieredCache(TieredCache):
+    """Tiered cache for JSON-serializable values."""
+
+    def encode(self, value) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, raw: bytes):
+        return json.loads(bytes(raw).decode("utf-8"))
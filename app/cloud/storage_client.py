@@ -2,16 +2,27 @@ from __future__ import annotations
 
 import base64
 import io
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING
 from urllib.parse import urlparse
 import uuid
 
-from google.cloud import storage
-from PIL import Image
-
 from app.config import settings
+from app.logutils.metrics import instrument
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+_storage_client = None
+_client_lock = threading.Lock()
+_buckets: dict[str, storage.Bucket] = {}
+_upload_timings_ms: deque = deque(maxlen=256)
+_upload_stats = {"uploads": 0, "failures": 0, "bytes": 0}
+_stats_lock = threading.Lock()
 
-credentials_path = settings.GOOGLE_APPLICATION_CREDENTIALS
-storage_client = storage.Client.from_service_account_json(credentials_path)
+ACCEPTED_IMAGE_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
 
 def get_bucket_name() -> str:
     bucket_name = settings.BUCKET_NAME
@@ -29,12 +40,90 @@ def build_illustration_blob_path(user_id: str, journal_id: str, filename: str) -
     return f"uploads/videos/{user_id}/{journal_id}/illustrations/image_uploads/{filename}"
 
 
+def get_storage_client() -> storage.Client:
+    global _storage_client
+    if _storage_client is None:
+        with _client_lock:
+            if _storage_client is None:
+                from google.auth.transport.requests import AuthorizedSession
+                from google.cloud import storage
+                from google.oauth2 import service_account
+                from requests.adapters import HTTPAdapter
+
+                credentials = service_account.Credentials.from_service_account_file(
+                    settings.GOOGLE_APPLICATION_CREDENTIALS, scopes=storage.Client.SCOPE
+                )
+                # Size the connection pool for parallel uploads.
+                session = AuthorizedSession(credentials)
+                session.mount(
+                    "https://",
+                    HTTPAdapter(pool_connections=4, pool_maxsize=max(10, settings.GCS_MAX_CONCURRENCY))
+                )
+                _storage_client = storage.Client(
+                    project=credentials.project_id, credentials=credentials, _http=session
+                )
+    return _storage_client
+
+
+def get_bucket(bucket_name: str) -> storage.Bucket:
+    # Only the configured bucket is kept; names taken from image URLs are not,
+    # so callers cannot grow this map. Bucket handles are cheap to build.
+    if bucket_name != settings.BUCKET_NAME:
+        return get_storage_client().bucket(bucket_name)
+    bucket = _buckets.get(bucket_name)
+    if bucket is None:
+        bucket = _buckets.setdefault(bucket_name, get_storage_client().bucket(bucket_name))
+    return bucket
+
+
+@instrument("storage.upload_bytes_to_bucket")
 def upload_bytes_to_bucket(data: bytes, blob_path: str, content_type: str) -> str:
-    bucket = storage_client.bucket(get_bucket_name())
+    from google.api_core.exceptions import PreconditionFailed
+    from google.cloud.storage.retry import DEFAULT_RETRY
+
+    bucket = get_bucket(get_bucket_name())
     blob = bucket.blob(blob_path)
-    blob.upload_from_string(data, content_type=content_type)
+    
+    start_time = time.perf_counter()
+    try:
+        # Blob paths are unique, so with if_generation_match=0 a retry can only
+        # fail with 412 when an earlier attempt already created the object.
+        blob.upload_from_string(
+            data,
+            content_type=content_type,
+            if_generation_match=0,
+            retry=DEFAULT_RETRY,
+            timeout=settings.GCS_UPLOAD_TIMEOUT_SECONDS,
+        )
+    except PreconditionFailed:
+        pass
+    except Exception:
+        _record_upload(time.perf_counter() - start_time, 0, failed=True)
+        raise
+    _record_upload(time.perf_counter() - start_time, len(data))
+    
     return f"https://storage.googleapis.com/{bucket.name}/{blob_path}"
 
+
+def _record_upload(elapsed_seconds: float, size: int, failed: bool = False):
+    with _stats_lock:
+        _upload_timings_ms.append(int(elapsed_seconds * 1000))
+        if failed:
+            _upload_stats["failures"] += 1
+        else:
+            _upload_stats["uploads"] += 1
+            _upload_stats["bytes"] += size
+
+
+def get_upload_stats() -> dict:
+    with _stats_lock:
+        timings = sorted(_upload_timings_ms)
+        stats = dict(_upload_stats)
+    if timings:
+        stats["recent_p50_ms"] = timings[len(timings) // 2]
+        stats["recent_max_ms"] = timings[-1]
+    return stats
+
 def parse_gcs_https_url(url: str) -> tuple[str, str]:
     parsed = urlparse(url)
     if parsed.scheme != "https" or parsed.netloc != "storage.googleapis.com":
@@ -45,42 +134,65 @@ def parse_gcs_https_url(url: str) -> tuple[str, str]:
     return parts[0], parts[1]
 
 
-def download_blob_bytes(url: str) -> bytes:
+def get_blob_with_metadata(url: str) -> storage.Blob:
     bucket_name, blob_name = parse_gcs_https_url(url)
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    return blob.download_as_bytes()
-
-
-def load_image(url: str) -> Image.Image:
-    image_bytes = download_blob_bytes(url)
-    return Image.open(io.BytesIO(image_bytes)).convert("RGB")
-
-
-def determine_mime_type(format_hint: str | None, encoding_hint: str | None) -> str:
-    if encoding_hint:
-        return encoding_hint
-    if format_hint:
-        ext = format_hint.lower().lstrip(".")
-        if ext in {"jpg", "jpeg"}:
-            return "image/jpeg"
-        if ext == "png":
-            return "image/png"
-        if ext == "webp":
-            return "image/webp"
-    return "image/jpeg"
-
-
-def pil_image_to_data_url(
-    pil_image: Image.Image,
-    format_hint: str | None,
-    encoding_hint: str | None,
-) -> str:
-    buffer = io.BytesIO()
-    fmt = (format_hint or "jpeg").upper()
-    if fmt == "JPG":
-        fmt = "JPEG"
-    pil_image.save(buffer, format=fmt)
-    mime_type = determine_mime_type(format_hint, encoding_hint)
-    encoded = base64.b64encode(buffer.getvalue()).decode("utf-8")
-    return f"data:{mime_type};base64,{encoded}"
\ No newline at end of file
+    blob = get_bucket(bucket_name).get_blob(blob_name)
+    if blob is None:
+        raise FileNotFoundError(f"Image not found: {url}")
+    return blob
+
+
+def blob_identity(blob: storage.Blob) -> str:
+    version = blob.generation or blob.md5_hash or blob.etag
+    return f"{blob.bucket.name}/{blob.name}#{version}"
+
+
+def download_blob_within_limit(blob: storage.Blob, max_bytes: int | None = None) -> bytes:
+    max_bytes = max_bytes or settings.IMAGE_MAX_BYTES
+    if blob.size is not None and blob.size > max_bytes:
+        raise ValueError(f"Image is {blob.size} bytes; the limit is {max_bytes} bytes.")
+    return blob.download_as_bytes(if_generation_match=blob.generation)
+
+
+def sniff_image_mime_type(data: bytes) -> str | None:
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def bytes_to_data_url(data: bytes, mime_type: str) -> str:
+    encoded = base64.b64encode(data).decode("utf-8")
+    return f"data:{mime_type};base64,{encoded}"
+
+
+def prepare_image_bytes(
+    image_bytes: bytes,
+    max_edge: int | None = None,
+    passthrough_max_bytes: int | None = None,
+) -> tuple[bytes, str]:
+    max_edge = max_edge or settings.IMAGE_MAX_EDGE
+    passthrough_max_bytes = passthrough_max_bytes or settings.IMAGE_PASSTHROUGH_MAX_BYTES
+
+    mime_type = sniff_image_mime_type(image_bytes)
+    if mime_type in ACCEPTED_IMAGE_MIME_TYPES and len(image_bytes) <= passthrough_max_bytes:
+        return image_bytes, mime_type
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as pil_image:
+        if pil_image.format == "JPEG":
+            pil_image.draft("RGB", (max_edge, max_edge))
+        pil_image.thumbnail((max_edge, max_edge))
+        buffer = io.BytesIO()
+        pil_image.convert("RGB").save(buffer, format="JPEG", quality=settings.IMAGE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+
+@instrument("storage.prepare_image")
+def prepare_blob_data_url(blob: storage.Blob) -> str:
+    image_bytes, mime_type = prepare_image_bytes(download_blob_within_limit(blob))
+    return bytes_to_data_url(image_bytes, mime_type)
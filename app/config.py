@@ -12,5 +12,53 @@ class Settings:
     GCP_LOCATION: str = os.getenv("GCP_LOCATION", "your_gcp_location")
     BUCKET_NAME: str = os.getenv("BUCKET_NAME", "your_bucket_name")
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "path_to_credentials")
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "google")
+    LOCAL_EMBEDDING_DIMENSIONS: int = int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", "512"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(os.getcwd(), ".cache", "embeddings"))
+    DOC_EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("DOC_EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+    DOC_EMBEDDING_CACHE_MAX_MB: float = float(os.getenv("DOC_EMBEDDING_CACHE_MAX_MB", "64"))
+    DOC_EMBEDDING_CACHE_DISK_PATH: str = os.getenv("DOC_EMBEDDING_CACHE_DISK_PATH", "")
+    DOC_EMBEDDING_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("DOC_EMBEDDING_CACHE_DISK_MAX_ENTRIES", "200000"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
+    IMAGEN_MAX_CONCURRENCY: int = int(os.getenv("IMAGEN_MAX_CONCURRENCY", "2"))
+    GCS_MAX_CONCURRENCY: int = int(os.getenv("GCS_MAX_CONCURRENCY", "16"))
+    VLM_MAX_CONCURRENT_IMAGES: int = int(os.getenv("VLM_MAX_CONCURRENT_IMAGES", "4"))
+    IMAGE_MAX_BYTES: int = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+    IMAGE_PASSTHROUGH_MAX_BYTES: int = int(os.getenv("IMAGE_PASSTHROUGH_MAX_BYTES", str(1536 * 1024)))
+    IMAGE_MAX_EDGE: int = int(os.getenv("IMAGE_MAX_EDGE", "1536"))
+    IMAGE_JPEG_QUALITY: int = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+    VLM_CACHE_MAX_ENTRIES: int = int(os.getenv("VLM_CACHE_MAX_ENTRIES", "5000"))
+    VLM_CACHE_TTL_SECONDS: int = int(os.getenv("VLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+    VLM_CACHE_DISK_PATH: str = os.getenv("VLM_CACHE_DISK_PATH", os.path.join(os.getcwd(), ".cache", "vlm_descriptions.sqlite"))
+    GCS_UPLOAD_TIMEOUT_SECONDS: int = int(os.getenv("GCS_UPLOAD_TIMEOUT_SECONDS", "60"))
+    BLOCKING_IO_THREADS: int = int(os.getenv("BLOCKING_IO_THREADS", "32"))
+    LOG_QUEUE_MAX_SIZE: int = int(os.getenv("LOG_QUEUE_MAX_SIZE", "10000"))
+    LOG_FLUSH_BATCH_SIZE: int = int(os.getenv("LOG_FLUSH_BATCH_SIZE", "200"))
+    LOG_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", "1.0"))
+    LOG_SEGMENTS_DIR: str = os.getenv("LOG_SEGMENTS_DIR", "")
+    LOG_ARCHIVE_AFTER_DAYS: int = int(os.getenv("LOG_ARCHIVE_AFTER_DAYS", "7"))
+    LOG_RETENTION_DAYS: int = int(os.getenv("LOG_RETENTION_DAYS", "90"))
+    LOG_PAGE_MAX_SIZE: int = int(os.getenv("LOG_PAGE_MAX_SIZE", "1000"))
+    CLASSIFICATION_EMBEDDING_MODE: str = os.getenv("CLASSIFICATION_EMBEDDING_MODE", "document")
+    CLASSIFY_BATCH_MAX_ENTRIES: int = int(os.getenv("CLASSIFY_BATCH_MAX_ENTRIES", "64"))
+    SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+    SESSION_MAX_ENTRIES: int = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+    SESSION_MAX_MB: float = float(os.getenv("SESSION_MAX_MB", "128"))
+    ILLUSTRATION_PLANNING_MODE: str = os.getenv("ILLUSTRATION_PLANNING_MODE", "two_step")
+    PARAGRAPH_RANKER_ENABLED: bool = os.getenv("PARAGRAPH_RANKER_ENABLED", "true").lower() == "true"
+    PARAGRAPH_RANKER_MAX_CANDIDATES: int = int(os.getenv("PARAGRAPH_RANKER_MAX_CANDIDATES", "3"))
+    PARAGRAPH_RANKER_CONFIDENCE_MARGIN: float = float(os.getenv("PARAGRAPH_RANKER_CONFIDENCE_MARGIN", "2.0"))
+    ILLUSTRATION_CACHE_MAX_ENTRIES: int = int(os.getenv("ILLUSTRATION_CACHE_MAX_ENTRIES", "2000"))
+    ILLUSTRATION_CACHE_MAX_MB: float = float(os.getenv("ILLUSTRATION_CACHE_MAX_MB", "8"))
+    ILLUSTRATION_CACHE_TTL_SECONDS: int = int(os.getenv("ILLUSTRATION_CACHE_TTL_SECONDS", str(24 * 3600)))
+    ILLUSTRATION_CACHE_DISK_PATH: str = os.getenv("ILLUSTRATION_CACHE_DISK_PATH", "")
+    ILLUSTRATION_JOB_WORKERS: int = int(os.getenv("ILLUSTRATION_JOB_WORKERS", "2"))
+    ILLUSTRATION_JOB_QUEUE_MAX: int = int(os.getenv("ILLUSTRATION_JOB_QUEUE_MAX", "100"))
+    ILLUSTRATION_JOB_TTL_SECONDS: int = int(os.getenv("ILLUSTRATION_JOB_TTL_SECONDS", "3600"))
+    CHAT_HISTORY_MAX_TOKENS: int = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "3000"))
+    SESSION_DB_PATH: str = os.getenv("SESSION_DB_PATH", os.path.join(os.getcwd(), ".cache", "sessions.sqlite"))
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,303 @@
+import base64
+import datetime
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+
+SEGMENT_PREFIX = "api_logs-"
+SEGMENT_SUFFIX = ".sqlite"
+
+COLUMNS = [
+    'timestamp',
+    'request_method',
+    'endpoint',
+    'status_code',
+    'latency_ms',
+    'client_id',
+    'success',
+    'prediction',
+    'confidence',
+    'error_message'
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    request_method TEXT,
+    endpoint TEXT,
+    status_code INTEGER,
+    latency_ms INTEGER,
+    client_id TEXT,
+    success INTEGER,
+    prediction TEXT,
+    confidence REAL,
+    error_message TEXT
+);
+CREATE INDEX IF NOT EXISTS logs_timestamp ON logs (timestamp);
+CREATE INDEX IF NOT EXISTS logs_client_id ON logs (client_id, timestamp);
+CREATE INDEX IF NOT EXISTS logs_status_code ON logs (status_code, timestamp);
+CREATE INDEX IF NOT EXISTS logs_success ON logs (success, timestamp);
+"""
+
+INSERT_SQL = f"INSERT INTO logs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+INSERT_MISSING_SQL = (
+    f"INSERT INTO logs ({', '.join(COLUMNS)}) SELECT {', '.join('?' * len(COLUMNS))} "
+    "WHERE NOT EXISTS (SELECT 1 FROM logs WHERE timestamp = ? AND request_method IS ? "
+    "AND endpoint IS ? AND status_code IS ? AND latency_ms IS ? AND client_id IS ?)"
+)
+
+def encode_cursor(segment_day: str, timestamp: str, row_id: int) -> str:
+    raw = f"{segment_day}|{timestamp}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[str, str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        segment_day, timestamp, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        datetime.date.fromisoformat(segment_day)
+        return segment_day, timestamp, int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _normalize_timestamp(value: str) -> str:
+    return datetime.datetime.fromisoformat(value).isoformat()
+
+class LogStore:
+    """Request logs in one indexed SQLite segment per day.
+
+    Segments older than ``archive_after_days`` are gzip-compressed into the
+    archive directory and no longer queried; archives are deleted after
+    ``retention_days``.
+    """
+
+    def __init__(self, directory: str, archive_after_days: int = 7, retention_days: int = 90):
+        self.directory = directory
+        self.archive_directory = os.path.join(directory, "archive")
+        self.archive_after_days = archive_after_days
+        self.retention_days = retention_days
+        
+        self._lock = threading.Lock()
+        self._connections: dict[str, sqlite3.Connection] = {}
+        self._last_rotation: datetime.date = None
+
+    def segment_path(self, segment_day: str) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment_day}{SEGMENT_SUFFIX}")
+
+    def segment_days(self) -> list[str]:
+        pattern = os.path.join(self.directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+        days = [
+            os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+            for path in glob.glob(pattern)
+        ]
+        return sorted(days)
+
+    def append(self, entries: list[dict], skip_existing: bool = False):
+        """Insert rows into their day segments.
+
+        With ``skip_existing``, rows identical to one already stored are left
+        out, so re-running an interrupted import does not duplicate rows.
+        """
+        by_day: dict[str, list[tuple]] = {}
+        for entry in entries:
+            timestamp = str(entry['timestamp'])
+            by_day.setdefault(timestamp[:10], []).append((
+                timestamp,
+                entry.get('request_method'),
+                entry.get('endpoint'),
+                _to_int(entry.get('status_code')),
+                _to_int(entry.get('latency_ms')),
+                entry.get('client_id') or None,
+                _to_bool_int(entry.get('success')),
+                entry.get('prediction') or None,
+                _to_float(entry.get('confidence')),
+                entry.get('error_message') or None,
+            ))
+        
+        with self._lock:
+            for segment_day, rows in by_day.items():
+                conn = self._writer_connection(segment_day)
+                with conn:
+                    if skip_existing:
+                        conn.executemany(INSERT_MISSING_SQL, [row + row[:6] for row in rows])
+                    else:
+                        conn.executemany(INSERT_SQL, rows)
+            
+            today = datetime.date.today()
+            if self._last_rotation != today:
+                self._rotate(today)
+
+    def query(self, filters: dict, limit: int, cursor: str = None, page_info: dict = None):
+        """Return an iterator over matching rows in time order, at most ``limit`` of them.
+
+        Filters and the cursor are validated eagerly; ``page_info["next_cursor"]``
+        is set once the iterator is exhausted.
+        """
+        start = _normalize_timestamp(filters['start_date']) if filters.get('start_date') else None
+        end = _normalize_timestamp(filters['end_date']) if filters.get('end_date') else None
+        after = decode_cursor(cursor) if cursor else None
+        
+        clauses, params = [], []
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if filters.get('status_code') is not None:
+            clauses.append("status_code = ?")
+            params.append(int(filters['status_code']))
+        if filters.get('client_id') is not None:
+            clauses.append("client_id = ?")
+            params.append(filters['client_id'])
+        if filters.get('success') is not None:
+            clauses.append("success = ?")
+            params.append(_to_bool_int(filters['success']))
+        
+        page_info = page_info if page_info is not None else {}
+        page_info["next_cursor"] = None
+        return self._iter_rows(start, end, after, clauses, params, limit, page_info)
+
+    def _iter_rows(self, start, end, after, clauses, params, limit, page_info):
+        remaining = limit
+        last_position = None
+        
+        for segment_day in self.segment_days():
+            if (start and segment_day < start[:10]) or (end and segment_day > end[:10]):
+                continue
+            if after and segment_day < after[0]:
+                continue
+            
+            segment_clauses = list(clauses)
+            segment_params = list(params)
+            if after and after[0] == segment_day:
+                segment_clauses.append("(timestamp, id) > (?, ?)")
+                segment_params.extend(after[1:])
+            where = f"WHERE {' AND '.join(segment_clauses)}" if segment_clauses else ""
+            
+            conn = sqlite3.connect(
+                f"file:{self.segment_path(segment_day)}?mode=ro", uri=True, check_same_thread=False
+            )
+            try:
+                rows = conn.execute(
+                    f"SELECT id, {', '.join(COLUMNS)} FROM logs {where} ORDER BY timestamp, id LIMIT ?",
+                    segment_params + [remaining + 1]
+                )
+                for row in rows:
+                    if remaining == 0:
+                        page_info["next_cursor"] = encode_cursor(*last_position)
+                        return
+                    last_position = (segment_day, row[1], row[0])
+                    remaining -= 1
+                    yield _row_to_dict(row)
+            finally:
+                conn.close()
+
+    def import_csv(self, csv_path: str, batch_size: int = 5000) -> int:
+        """Import a legacy CSV log; rows already in the store are skipped, so it can be re-run."""
+        import csv
+
+        imported = 0
+        with open(csv_path, newline='') as f:
+            batch = []
+            for row in csv.DictReader(f):
+                try:
+                    datetime.datetime.fromisoformat(row['timestamp'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self.append(batch, skip_existing=True)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                self.append(batch, skip_existing=True)
+                imported += len(batch)
+        return imported
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+    def _writer_connection(self, segment_day: str) -> sqlite3.Connection:
+        conn = self._connections.get(segment_day)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            if len(self._connections) >= 2:
+                oldest_day = min(self._connections)
+                self._connections.pop(oldest_day).close()
+            conn = sqlite3.connect(self.segment_path(segment_day), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._connections[segment_day] = conn
+        return conn
+
+    def _rotate(self, today: datetime.date):
+        self._last_rotation = today
+        archive_before = (today - datetime.timedelta(days=self.archive_after_days)).isoformat()
+        delete_before = (today - datetime.timedelta(days=self.retention_days)).isoformat()
+        
+        for segment_day in self.segment_days():
+            if segment_day >= archive_before:
+                continue
+            conn = self._connections.pop(segment_day, None)
+            if conn is not None:
+                conn.close()
+            try:
+                self._archive_segment(segment_day)
+            except OSError as e:
+                print(f"Could not archive log segment {segment_day}: {e}")
+        
+        pattern = os.path.join(self.archive_directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}.gz")
+        for path in glob.glob(pattern):
+            segment_day = os.path.basename(path)[len(SEGMENT_PREFIX):][:10]
+            if segment_day < delete_before:
+                os.remove(path)
+
+    def _archive_segment(self, segment_day: str):
+        os.makedirs(self.archive_directory, exist_ok=True)
+        source = self.segment_path(segment_day)
+        
+        checkpoint = sqlite3.connect(source)
+        try:
+            checkpoint.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            checkpoint.close()
+        
+        target = os.path.join(self.archive_directory, os.path.basename(source) + ".gz")
+        with open(source, "rb") as src, gzip.open(target + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(target + ".tmp", target)
+        
+        for path in (source, source + "-wal", source + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def _row_to_dict(row: tuple) -> dict:
+    entry = dict(zip(COLUMNS, row[1:]))
+    entry['success'] = bool(entry['success']) if entry['success'] is not None else None
+    return entry
+
+def _to_int(value):
+    if value in (None, ''):
+        return None
+    return int(value)
+
+def _to_float(value):
+    if value in (None, ''):
+        return None
+    return float(value)
+
+def _to_bool_int(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        return 1 if value.lower() == 'true' else 0
+    return 1 if value else 0
@@ -1,30 +1,199 @@
-import csv
 import os
 import datetime
+import fcntl
+import queue
+import threading
+import time
 from fastapi import Request
 
+from ..config import settings
+from .log_store import LogStore
+from .metrics import instrument
+
 LOGS_DIR = os.path.join(os.getcwd(), 'app', 'logutils')
 LOG_FILE = os.path.join(LOGS_DIR, 'api_logs.csv')
+LOG_SEGMENTS_DIR = settings.LOG_SEGMENTS_DIR or os.path.join(LOGS_DIR, 'segments')
+
+class _FlushRequest:
+    def __init__(self, done: threading.Event):
+        self.done = done
+
+class BufferedLogWriter:
+    """Collects log rows on a bounded queue and hands them to ``sink`` in batches."""
+
+    def __init__(
+        self,
+        sink,
+        max_queue_size: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0
+    ):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, entry: dict) -> bool:
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout: float = 5.0):
+        """Return once every row submitted before the call has been written.
 
-LOG_FIELDS = [
-    'timestamp',
-    'request_method',
-    'endpoint',
-    'status_code',
-    'latency_ms',
-    'client_id',
-    'success',
-    'prediction',
-    'confidence',
-    'error_message'
-]
-
-def init_log_file():
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, mode='w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=LOG_FIELDS)
-            writer.writeheader()
+        While the writer thread runs, the flush is handed to it so that rows it
+        has already taken off the queue are written first; otherwise the queue
+        is written out here.
+        """
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            self._write_pending()
+            return
+
+        done = threading.Event()
+        try:
+            self._queue.put(_FlushRequest(done), timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors
+        }
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = []
+            flush_requests = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop_event.is_set():
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if isinstance(entry, _FlushRequest):
+                    flush_requests.append(entry)
+                    break
+                batch.append(entry)
             
+            if batch:
+                with self._write_lock:
+                    self._write(batch)
+            for request in flush_requests:
+                request.done.set()
+        
+        self._write_pending()
+
+    def _write_pending(self):
+        entries = []
+        flush_requests = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(entry, _FlushRequest):
+                flush_requests.append(entry)
+            else:
+                entries.append(entry)
+        
+        with self._write_lock:
+            self._write(entries)
+        for request in flush_requests:
+            request.done.set()
+
+    def _write(self, entries: list[dict]):
+        if not entries:
+            return
+        try:
+            self.sink(entries)
+            self.written += len(entries)
+        except Exception as e:
+            self.write_errors += 1
+            self.dropped += len(entries)
+            print(f"Error logging requests: {e}")
+
+log_store = LogStore(
+    LOG_SEGMENTS_DIR,
+    archive_after_days=settings.LOG_ARCHIVE_AFTER_DAYS,
+    retention_days=settings.LOG_RETENTION_DAYS
+)
+
+log_writer = BufferedLogWriter(
+    log_store.append,
+    max_queue_size=settings.LOG_QUEUE_MAX_SIZE,
+    batch_size=settings.LOG_FLUSH_BATCH_SIZE,
+    flush_interval=settings.LOG_FLUSH_INTERVAL_SECONDS
+)
+
+def migrate_legacy_log_file():
+    """Import the legacy CSV log once; meant to run off the event loop.
+
+    The file is claimed by renaming it, and the importing worker holds a lock
+    on the claimed file, so only one worker imports it. An interrupted import
+    leaves the claimed file behind and is resumed on a later startup; rows it
+    already wrote are skipped.
+    """
+    importing_file = LOG_FILE + '.importing'
+    if os.path.exists(LOG_FILE) and not os.path.exists(importing_file):
+        try:
+            os.replace(LOG_FILE, importing_file)
+        except FileNotFoundError:
+            pass
+    if not os.path.exists(importing_file):
+        return
+    
+    try:
+        with open(importing_file, 'rb') as claim:
+            try:
+                fcntl.flock(claim, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            if not os.path.exists(importing_file):
+                return
+            imported = log_store.import_csv(importing_file)
+            os.replace(importing_file, LOG_FILE + '.imported')
+        print(f"Imported {LOG_FILE} into the log store ({imported} rows read).")
+    except Exception as e:
+        print(f"Could not import legacy log file: {e}")
+
+@instrument("logging.log_request")
 def log_request(
     request: Request, 
     status_code: int, 
@@ -34,8 +203,6 @@ def log_request(
     confidence: float = None, 
     error_message: str = None
 ):
-    init_log_file()
-    
     client_id = request.headers.get('X-Client-ID')
     log_entry = {
         'timestamp': datetime.datetime.now().isoformat(),
@@ -50,47 +217,13 @@ def log_request(
         'error_message': error_message or ''
     }
     
-    try:
-        with open(LOG_FILE, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=LOG_FIELDS)
-            writer.writerow(log_entry)
-    except Exception as e:
-        print(f"Error logging request: {e}") # CHANGE THIS
+    log_writer.submit(log_entry)
         
     return log_entry
 
-def get_logs(filters: dict = {}):
-    init_log_file()
-    
-    logs = []
-    try:
-        with open(LOG_FILE, mode='r', newline='') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if 'start_date' in filters and 'end_date' in filters:
-                    try:
-                        log_date = datetime.datetime.fromisoformat(row['timestamp'])
-                        start_date = datetime.datetime.fromisoformat(filters['start_date'])
-                        end_date = datetime.datetime.fromisoformat(filters['end_date'])
-                        if not (start_date <= log_date <= end_date):
-                            continue  # Skip to the next row if outside the date range
-                    except (ValueError, TypeError):
-                        continue # Skip rows with invalid date format
-                        
-                if 'status_code' in filters and row['status_code'] != str(filters['status_code']):
-                    continue
-
-                if 'client_id' in filters and row['client_id'] != filters['client_id']:
-                    continue
-
-                if 'success' in filters and row['success'].lower() != str(filters['success']).lower():
-                    continue
-
-                logs.append(row)
-                    
-    except (IOError, FileNotFoundError) as e:
-        raise IOError(f"Could not read log file: {e}")
-    except Exception as e:
-        raise Exception(f"An unexpected error occurred while retrieving logs: {e}")
-        
-    return logs
\ No newline at end of file
+def get_log_writer_stats() -> dict:
+    return log_writer.stats()
+
+def query_logs(filters: dict, limit: int, cursor: str = None, page_info: dict = None):
+    log_writer.flush()
+    return log_store.query(filters, limit, cursor=cursor, page_info=page_info)
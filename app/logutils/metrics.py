@@ -0,0 +1,187 @@
+import functools
+import inspect
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: list = []
+_collectors: list = []
+_registry_lock = threading.Lock()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+class Gauge(Counter):
+    def set(self, *label_values, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def observe(self, *label_values, value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (bucket_counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+STAGE_DURATION = Histogram(
+    "journal_stage_duration_seconds", "Latency of service pipeline stages.", ("stage",)
+)
+STAGE_CALLS = Counter(
+    "journal_stage_calls_total", "Service pipeline stage calls by outcome.", ("stage", "outcome")
+)
+UPSTREAM_DURATION = Histogram(
+    "journal_upstream_duration_seconds", "Latency of calls to upstream services.", ("upstream",)
+)
+UPSTREAM_CALLS = Counter(
+    "journal_upstream_calls_total", "Calls to upstream services by outcome.", ("upstream", "outcome")
+)
+HTTP_DURATION = Histogram(
+    "journal_http_request_duration_seconds", "Latency of HTTP requests.", ("method", "route", "status_code")
+)
+PARAGRAPH_SHORTLIST_DECISIONS = Counter(
+    "journal_paragraph_shortlist_decisions_total",
+    "Illustration paragraph choices made locally versus sent to the LLM.",
+    ("decision",)
+)
+COMPONENT_STAT = Gauge(
+    "journal_component_stat", "Numeric runtime statistics of caches, pools and writers.", ("component", "stat")
+)
+
+def record_stage(stage: str, elapsed_seconds: float, outcome: str = "success"):
+    STAGE_DURATION.observe(stage, value=elapsed_seconds)
+    STAGE_CALLS.inc(stage, outcome)
+
+def record_upstream(upstream: str, elapsed_seconds: float, outcome: str = "success"):
+    UPSTREAM_DURATION.observe(upstream, value=elapsed_seconds)
+    UPSTREAM_CALLS.inc(upstream, outcome)
+
+def instrument(stage: str):
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start_time = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await func(*args, **kwargs)
+                    outcome = "success"
+                    return result
+                finally:
+                    record_stage(stage, time.perf_counter() - start_time, outcome)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "success"
+                return result
+            finally:
+                record_stage(stage, time.perf_counter() - start_time, outcome)
+        return wrapper
+    return decorator
+
+def register_collector(collector):
+    with _registry_lock:
+        _collectors.append(collector)
+
+def _collect_component_stats():
+    for collector in list(_collectors):
+        try:
+            components = collector()
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for component, stats in components.items():
+            for stat, value in _flatten(stats):
+                COMPONENT_STAT.set(component, stat, value=value)
+
+def _flatten(stats: dict, prefix: str = ""):
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+        elif isinstance(value, dict):
+            yield from _flatten(value, f"{name}.")
+
+def render_metrics() -> str:
+    _collect_component_stats()
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,34 +1,91 @@
+import asyncio
+import json
 import time
-from fastapi import FastAPI, Request, Depends, Query, HTTPException, status
+from contextlib import aclosing
+from fastapi import FastAPI, Request, Response, Depends, Query, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import Optional
-from langchain_core.messages import HumanMessage
 
+from .cloud import storage_client
+from .config import settings
 from .dependencies import verify_api_key
-from .logutils.logger import get_logs, log_request
+from .logutils import metrics
+from .logutils.logger import (
+    get_log_writer_stats,
+    log_request,
+    log_writer,
+    migrate_legacy_log_file,
+    query_logs
+)
 
 from .services import (
     classification_service, 
     embedding_service, 
     illustration_service,
+    illustration_jobs,
     elaboration_service,
-    session_service
+    session_service,
+    model_provider,
+    upstream,
+    vlm_service
 )
 
 from .schemas import(
     LogFilters, 
     ClassificationRequest, 
     ClassificationResponse, 
+    BatchClassificationRequest,
+    BatchClassificationItem,
+    BatchClassificationResponse,
     IllustrationRequest, 
     IllustrationResponse,
+    IllustrationJobResponse,
     ElaborationChatRequest,
     ElaborationChatResponse,
 
 )
 
 app = FastAPI()
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start_time = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_DURATION.observe(
+            request.method,
+            route.path if route else "unmatched",
+            str(status_code),
+            value=time.perf_counter() - start_time
+        )
+
 @app.on_event("startup")
 async def startup_event():
+    log_writer.start()
+    illustration_jobs.job_queue.start()
     embedding_service.initialize_embeddings()
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(upstream.blocking_executor, migrate_legacy_log_file)
+    loop.run_in_executor(upstream.blocking_executor, warm_up)
+
+def warm_up():
+    model_provider.warm_up_clients()
+    try:
+        storage_client.get_storage_client()
+    except Exception as e:
+        print(f"Could not warm up storage client: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await illustration_jobs.job_queue.stop()
+    log_writer.stop()
+    upstream.shutdown()
 
 @app.post("/classify", dependencies=[Depends(verify_api_key)])
 async def classify(
@@ -38,7 +95,7 @@ async def classify(
     start_time = time.perf_counter()
     
     try:
-        result = classification_service.classify_journal(payload)
+        result = await classification_service.aclassify_journal(payload)
 
         latency_ms = int((time.perf_counter() - start_time) * 1000)
         log_request(
@@ -53,6 +110,7 @@ async def classify(
         response_data = {
             "emotion_classification": result["emotion_classification"],
             "emotion_tags": result["emotion_tags"],
+            "image_errors": result.get("image_errors"),
             "latency_ms": latency_ms
         }
         return ClassificationResponse(**response_data)
@@ -65,6 +123,51 @@ async def classify(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal Server Error: {e}"
         )
+
+@app.post("/classify/batch", dependencies=[Depends(verify_api_key)])
+async def classify_batch(
+    request: Request,
+    payload: BatchClassificationRequest
+):
+    start_time = time.perf_counter()
+    
+    if len(payload.entries) > settings.CLASSIFY_BATCH_MAX_ENTRIES:
+        log_request(request, 400, 0, False, error_message="Batch too large")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch may contain at most {settings.CLASSIFY_BATCH_MAX_ENTRIES} entries."
+        )
+    
+    try:
+        results = await classification_service.aclassify_journals(payload.entries)
+        
+        items = [BatchClassificationItem(index=i, **result) for i, result in enumerate(results)]
+        failed = sum(1 for item in items if item.error)
+
+        latency_ms = int((time.perf_counter() - start_time) * 1000)
+        log_request(
+            request=request,
+            status_code=200,
+            latency_ms=latency_ms,
+            success=failed == 0,
+            error_message=f"{failed} of {len(items)} entries failed" if failed else None
+        )
+
+        return BatchClassificationResponse(
+            results=items,
+            succeeded=len(items) - failed,
+            failed=failed,
+            latency_ms=latency_ms
+        )
+    
+    except Exception as e:
+        latency_ms = int((time.perf_counter() - start_time) * 1000)
+        log_request(request, 500, latency_ms, False, error_message=str(e))
+        
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal Server Error: {e}"
+        )
         
 @app.post("/generate-illustration", dependencies=[Depends(verify_api_key)])
 async def generate_illustration(
@@ -73,52 +176,20 @@ async def generate_illustration(
 ):
     start_time = time.perf_counter()
     try:
-        illustrable_paragraph, position = illustration_service.identify_illustrable_paragraph(
-            payload.journal_text
-        )
-
-        paragraphs = [p for p in payload.journal_text.split("\n\n") if p.strip()]
-        total_paragraphs = len(paragraphs)
-
-        filled_positions = set(payload.filled_paragraph or [])
-        final_position = -1
-        for i in range(position, 0, -1):
-            if i not in filled_positions:
-                final_position = i
-                break
-
-        if final_position == -1:
-            for i in range(position + 1, total_paragraphs + 1):
-                if i not in filled_positions:
-                    final_position = i
-                    break
-
-        if final_position == -1:
-            final_position = 0
-
-        visual_essence = illustration_service.extract_visual_essence(illustrable_paragraph)
-
-        final_prompt = illustration_service.assemble_illustration_prompt(
-            visual_essence=visual_essence,
+        result = await illustration_service.arun_illustration_pipeline(
+            journal_text=payload.journal_text,
             style_preference=payload.style_preference,
-        )
-
-        generated_images = illustration_service.generate_illustration(
-            prompt=final_prompt,
             num_images=payload.num_images,
             user_id=payload.user_id,
             journal_id=payload.journal_id,
+            filled_paragraph=payload.filled_paragraph,
+            regenerate=payload.regenerate,
         )
 
         latency_ms = int((time.perf_counter() - start_time) * 1000)
         log_request(request, 200, latency_ms, True)
 
-        return IllustrationResponse(
-            images=generated_images,
-            prompt=final_prompt,
-            position_after_paragraph=final_position,
-            latency_ms=latency_ms,
-        )
+        return IllustrationResponse(**result, latency_ms=latency_ms)
 
     except Exception as e:
         latency_ms = int((time.perf_counter() - start_time) * 1000)
@@ -129,33 +200,69 @@ async def generate_illustration(
             detail=f"Internal Server Error: {e}",
         )
         
+@app.post("/illustration-jobs", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(verify_api_key)])
+async def submit_illustration_job(
+    request: Request,
+    payload: IllustrationRequest,
+    response: Response
+):
+    start_time = time.perf_counter()
+    try:
+        job, _ = illustration_jobs.job_queue.submit(payload)
+    except illustration_jobs.QueueFullError as e:
+        log_request(request, 503, 0, False, error_message=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
+    latency_ms = int((time.perf_counter() - start_time) * 1000)
+    log_request(request, 202, latency_ms, True)
+    response.headers["Location"] = f"/illustration-jobs/{job.job_id}"
+    return IllustrationJobResponse(**job.to_dict())
+
+@app.get("/illustration-jobs/{job_id}", dependencies=[Depends(verify_api_key)])
+async def get_illustration_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the job to finish before answering.")
+):
+    job = illustration_jobs.job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown or expired illustration job."
+        )
+    
+    await illustration_jobs.job_queue.wait(job, wait)
+    return IllustrationJobResponse(**job.to_dict())
+
 @app.post(
     "/elaboration-chat", response_model=ElaborationChatResponse, dependencies=[Depends(verify_api_key)])
 async def elaboration_chat(request: ElaborationChatRequest):
     print(request.task)
     
-    session = session_service.get_session(request.uuid)
-    
     if request.task == "elaborate":
-        suggestion = elaboration_service.analyze_journal_for_elaboration(
-            journal_text=request.journal_data.text,
-            excluded_highlights=session.excluded_highlights,
-            chat_history=session.chat_history
-        )
-        
-        if not suggestion:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No more paragraphs to elaborate on or journal is too short."
+        async with session_service.locked_session(request.uuid) as session:
+            suggestion = await elaboration_service.aanalyze_journal_for_elaboration(
+                journal_text=request.journal_data.text,
+                excluded_highlights=session.excluded_highlights,
+                chat_history=session.chat_history
             )
             
-        if suggestion.paragraph_index != -1:
-            session.excluded_highlights.add(suggestion.highlight_text)
-            
-        session.chat_history.add_elaborate_interaction(
-            journal_data=request.journal_data,
-            suggestion=suggestion
-        )
+            if not suggestion:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="No more paragraphs to elaborate on or journal is too short."
+                )
+                
+            if suggestion.paragraph_index != -1:
+                session.excluded_highlights.add(suggestion.highlight_text)
+                
+            session.chat_history.add_elaborate_interaction(
+                journal_data=request.journal_data,
+                suggestion=suggestion
+            )
+            await session_service.asave_session(request.uuid, session)
         
         return ElaborationChatResponse(
             uuid=request.uuid,
@@ -169,16 +276,25 @@ async def elaboration_chat(request: ElaborationChatRequest):
                 detail="Prompt is required for 'ask' tasks."
             )
         
-        assistant_response = elaboration_service.generate_ask_response(
-            chat_history=session.chat_history,
-            prompt=request.prompt
-        )
+        if request.stream:
+            return StreamingResponse(
+                stream_ask_events(request),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
         
-        session.chat_history.add_ask_interaction(
-            journal_data=request.journal_data,
-            prompt=request.prompt,
-            assistant_response=assistant_response
-        )
+        async with session_service.locked_session(request.uuid) as session:
+            assistant_response = await elaboration_service.agenerate_ask_response(
+                chat_history=session.chat_history,
+                prompt=request.prompt
+            )
+            
+            session.chat_history.add_ask_interaction(
+                journal_data=request.journal_data,
+                prompt=request.prompt,
+                assistant_response=assistant_response
+            )
+            await session_service.asave_session(request.uuid, session)
         
         return ElaborationChatResponse(
             uuid=request.uuid,
@@ -192,6 +308,66 @@ async def elaboration_chat(request: ElaborationChatRequest):
         )
 
 
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_ask_events(request: ElaborationChatRequest):
+    # The session stays locked for the whole stream so a concurrent request
+    # for the same uuid cannot overwrite the answer being recorded.
+    async with session_service.locked_session(request.uuid) as session:
+        parts = []
+        chunks = elaboration_service.astream_ask_response(
+            chat_history=session.chat_history,
+            prompt=request.prompt
+        )
+        try:
+            async with aclosing(chunks):
+                async for text in chunks:
+                    parts.append(text)
+                    yield sse_event("token", {"delta": text})
+        except asyncio.CancelledError:
+            # The client went away; the partial answer is not kept in the session.
+            print(f"Client disconnected from ask stream for session {request.uuid}")
+            raise
+        except Exception as e:
+            print(f"Error streaming ask response: {e}")
+            yield sse_event("error", {"detail": elaboration_service.ASK_ERROR_RESPONSE})
+            return
+        
+        assistant_response = "".join(parts)
+        session.chat_history.add_ask_interaction(
+            journal_data=request.journal_data,
+            prompt=request.prompt,
+            assistant_response=assistant_response
+        )
+        await session_service.asave_session(request.uuid, session)
+    yield sse_event("done", {"uuid": request.uuid, "assistant_response": assistant_response})
+
+def collect_stats():
+    return {
+        "document_embedding_cache": embedding_service.get_document_cache_stats(),
+        "classify_single_flight": classification_service.get_single_flight_stats(),
+        "vlm_description_cache": vlm_service.get_description_cache_stats(),
+        "illustration_cache": illustration_service.get_illustration_cache_stats(),
+        "model_clients": model_provider.get_client_stats(),
+        "gcs_uploads": storage_client.get_upload_stats(),
+        "request_log_writer": get_log_writer_stats(),
+        "sessions": session_service.get_session_stats(),
+        "illustration_jobs": illustration_jobs.job_queue.stats()
+    }
+
+metrics.register_collector(collect_stats)
+
+@app.get("/stats", dependencies=[Depends(verify_api_key)])
+async def stats():
+    return collect_stats()
+
+
+@app.get("/metrics", dependencies=[Depends(verify_api_key)])
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/logs", dependencies=[Depends(verify_api_key)])
 async def logs(
     request: Request,
@@ -200,23 +376,49 @@ async def logs(
     start_time = time.perf_counter()
     
     try:
+        active_filters = filters.dict(exclude_unset=True, exclude={"limit", "cursor"})
+        limit = min(filters.limit, settings.LOG_PAGE_MAX_SIZE)
+        page_info = {}
+        rows = await run_in_threadpool(
+            query_logs, active_filters, limit, cursor=filters.cursor, page_info=page_info
+        )
         
-        active_filters = filters.dict(exclude_unset=True)
-        logs_data = get_logs(active_filters)
-        
-        latency_ms = int((time.perf_counter() - start_time) * 1000)
-        log_request(request, 200, latency_ms, True)
-        
-        return {
-            "logs": logs_data,
-            "count": len(logs_data),
-            "latency_ms": time.perf_counter() - start_time
-        }
-        
+    except ValueError as e:
+        log_request(request, 400, 0, False, error_message=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         latency_ms = int((time.perf_counter() - start_time) * 1000)
         log_request(request, 500, latency_ms, False, error_message=str(e))
         
         return {
             "error": f"Internal server error: {str(e)}"
-        }, 500
\ No newline at end of file
+        }, 500
+    
+    def stream_logs():
+        count = 0
+        success = True
+        error = None
+        yield '{"logs": ['
+        try:
+            for row in rows:
+                yield (", " if count else "") + json.dumps(row)
+                count += 1
+        except Exception as e:
+            success = False
+            error = str(e)
+            print(f"Error streaming logs: {e}")
+        
+        latency_ms = int((time.perf_counter() - start_time) * 1000)
+        log_request(request, 200, latency_ms, success, error_message=error)
+        
+        yield "], " + json.dumps({
+            "count": count,
+            "next_cursor": page_info.get("next_cursor"),
+            "error": error,
+            "latency_ms": latency_ms
+        })[1:]
+    
+    return StreamingResponse(stream_logs(), media_type="application/json")
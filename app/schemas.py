@@ -7,6 +7,8 @@ class LogFilters(BaseModel):
     status_code: Optional[int] = None
     client_id: Optional[str] = None
     success: Optional[bool] = None
+    limit: int = Field(default=1000, ge=1, le=10000)
+    cursor: Optional[str] = None
     
 class ImageContext(BaseModel):
     url: str
@@ -34,6 +36,11 @@ class EmotionTag(BaseModel):
     tags: str
     similarity: float
     
+class ImageDescriptionError(BaseModel):
+    url: str
+    position: int
+    error: str
+    
 class ClassificationResponse(BaseModel):
     emotion_classification: EmotionClassification
     emotion_tags: List[EmotionTag]
@@ -42,6 +49,23 @@ class ClassificationResponse(BaseModel):
 class ClassificationResponse(BaseModel):
     emotion_classification: EmotionClassification
     emotion_tags: List[EmotionTag]
+    image_errors: Optional[List[ImageDescriptionError]] = None
+    latency_ms: int
+
+class BatchClassificationRequest(BaseModel):
+    entries: List[ClassificationRequest] = Field(min_length=1)
+
+class BatchClassificationItem(BaseModel):
+    index: int
+    emotion_classification: Optional[EmotionClassification] = None
+    emotion_tags: Optional[List[EmotionTag]] = None
+    image_errors: Optional[List[ImageDescriptionError]] = None
+    error: Optional[str] = None
+
+class BatchClassificationResponse(BaseModel):
+    results: List[BatchClassificationItem]
+    succeeded: int
+    failed: int
     latency_ms: int
 
 class IllustrationRequest(BaseModel):
@@ -51,12 +75,27 @@ class IllustrationRequest(BaseModel):
     num_images: int = Field(ge=1, le=4)
     style_preference: str | None = "Digital Painting"
     filled_paragraph: list[str] = []
+    regenerate: bool = False # bypass the illustration cache and generate new images
 class IllustrationResponse(BaseModel):
     images: List[str] # List of base64 encoded images
     prompt: str
     position_after_paragraph: int
     latency_ms: int
     
+class IllustrationJobResult(BaseModel):
+    images: List[str]
+    prompt: str
+    position_after_paragraph: int
+
+class IllustrationJobResponse(BaseModel):
+    job_id: str
+    status: str # queued, running, succeeded or failed
+    result: Optional[IllustrationJobResult] = None
+    error: Optional[str] = None
+    created_at: float
+    queue_ms: int
+    run_ms: Optional[int] = None
+    
 class ElaborationSuggestion(BaseModel):
     paragraph_index: int
     strategy_used: str
@@ -72,6 +111,7 @@ class ElaborationChatRequest(BaseModel):
     task: str
     journal_data: JournalData
     prompt: Optional[str] = None
+    stream: bool = False
     
 class ElaborationChatResponse(BaseModel):
     uuid: str
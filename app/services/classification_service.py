@@ -1,69 +1,200 @@
+import asyncio
+
+import numpy as np
+
+from ..config import settings
 from ..schemas import ClassificationRequest, EntryData
 from . import vlm_service
 from . import embedding_service
+from .journal_model import parse_journal
+from .single_flight import SingleFlight, canonical_key
+from ..logutils.metrics import instrument
+
+MAX_TAGS = 3
+TAG_SIMILARITY_RATIO = 0.95
+
+classify_flights = SingleFlight()
+
+@instrument("classification.classify_journal")
+async def aclassify_journal(
+    payload: ClassificationRequest
+) -> dict:
+    # Identical requests in flight at the same time (client retries, double
+    # submits) share a single computation.
+    return await classify_flights.do(canonical_key(payload), _aclassify_journal, payload)
+
 
-def classify_journal(
+async def _aclassify_journal(
     payload: ClassificationRequest
 ) -> dict:
+    if settings.CLASSIFICATION_EMBEDDING_MODE == "paragraph":
+        # Each paragraph and image description is embedded and cached on its
+        # own, so editing one paragraph only re-embeds that paragraph.
+        segments, image_errors = await abuild_document_segments(payload)
+        doc_embedding = await embedding_service.aembed_segments(segments)
+    else:
+        super_document, image_errors = await abuild_super_document(payload)
+        doc_embedding = await embedding_service.aembed_document(super_document)
+    
+    return _with_image_errors(score_document(doc_embedding), image_errors)
+
+
+def get_single_flight_stats() -> dict:
+    return classify_flights.stats()
+
+
+@instrument("classification.classify_journals")
+async def aclassify_journals(
+    payloads: list[ClassificationRequest]
+) -> list[dict]:
+    built = await asyncio.gather(
+        *(abuild_super_document(payload) for payload in payloads),
+        return_exceptions=True
+    )
+    
+    chunks = await asyncio.gather(
+        *(_aembed_chunk(batch) for _, batch in embedding_service.iter_batches(_built_documents(built)))
+    )
+    embedded = [vector for chunk in chunks for vector in chunk]
+    
+    return _score_built_documents(built, embedded)
+
+
+async def _aembed_chunk(batch: list[str]) -> list:
+    """Embed a chunk in one call; if that fails, retry its entries one at a time.
+
+    Returns a vector or the exception for each entry, so one bad entry only
+    fails itself.
+    """
+    try:
+        return await embedding_service.aembed_documents(batch)
+    except Exception as e:
+        if len(batch) == 1:
+            return [e]
+    
+    singles = await asyncio.gather(
+        *(embedding_service.aembed_documents([text]) for text in batch),
+        return_exceptions=True
+    )
+    return [single if isinstance(single, BaseException) else single[0] for single in singles]
+
+
+def _built_documents(built: list) -> list[str]:
+    return [item[0] for item in built if not isinstance(item, BaseException)]
+
+
+def _score_built_documents(built: list, embedded: list) -> list[dict]:
+    results: list[dict] = [None] * len(built)
+    
+    document_indices = []
+    for i, item in enumerate(built):
+        if isinstance(item, BaseException):
+            results[i] = {"error": f"Failed to build document: {item}"}
+        else:
+            document_indices.append(i)
+    
+    scored_indices, doc_embeddings = [], []
+    for i, doc_embedding in zip(document_indices, embedded):
+        if isinstance(doc_embedding, BaseException):
+            results[i] = {"error": f"Failed to embed document: {doc_embedding}"}
+        else:
+            scored_indices.append(i)
+            doc_embeddings.append(doc_embedding)
+
+    if doc_embeddings:
+        for i, result in zip(scored_indices, score_documents(doc_embeddings)):
+            results[i] = _with_image_errors(result, built[i][1])
+    
+    return results
+
+
+def _with_image_errors(result: dict, image_errors: list[dict]) -> dict:
+    if image_errors:
+        result["image_errors"] = image_errors
+    return result
+
+
+async def abuild_super_document(payload: ClassificationRequest) -> tuple[str, list[dict]]:
+    segments, image_errors = await abuild_document_segments(payload)
+    return "\n".join(segments), image_errors
+
+
+@instrument("classification.build_super_document")
+async def abuild_document_segments(payload: ClassificationRequest) -> tuple[list[str], list[dict]]:
     image_descriptions = []
     if payload.media_context and payload.media_context.images:
-        image_descriptions = vlm_service.generate_image_descriptions(
+        image_descriptions = await vlm_service.agenerate_image_descriptions(
             payload.media_context.images
         )
         
-    super_document = construct_super_document(
+    image_errors = [d for d in image_descriptions if d.get("error")]
+    segments = construct_document_segments(
         entry_data = payload.entry_data,
         video_emotion = payload.media_context.video_emotion if payload.media_context else None,
         video_confidence = payload.media_context.video_confidence if payload.media_context else None,    
-        image_descriptions = image_descriptions
+        image_descriptions = [d for d in image_descriptions if not d.get("error")]
     )
+    return segments, image_errors
 
-    doc_embedding = embedding_service.embed_document(super_document)
+
+def score_document(doc_embedding: list[float]) -> dict:
+    return score_documents([doc_embedding])[0]
+
+
+@instrument("classification.score_documents")
+def score_documents(doc_embeddings: list[list[float]]) -> list[dict]:
+    emotion_labels = embedding_service.embedding_store["classifications"]["labels"]
+    emotion_scores = embedding_service.score_label_matrix(doc_embeddings, "classifications")
+    if emotion_scores.shape[1] == 0:
+        raise RuntimeError("Label embeddings have not been initialized.")
     
-    classification_results = []
-    for label, label_embedding in embedding_service.embedding_store["classifications"].items():
-        similarity = embedding_service.calculate_cosine_similarity(doc_embedding, label_embedding)
-        classification_results.append({"emotion": label, "similarity": similarity})
+    tag_scores = embedding_service.score_label_matrix(doc_embeddings, "tags")
+    best_indices = np.argmax(emotion_scores, axis=1)
     
-    best_classification = max(classification_results, key=lambda x: x['similarity'])
+    results = []
+    for row, best_index in enumerate(best_indices):
+        results.append({
+            "emotion_classification": {
+                "emotion": emotion_labels[best_index],
+                "similarity": float(emotion_scores[row, best_index])
+            },
+            "emotion_tags": select_top_tags(tag_scores[row])
+        })
     
-    all_tags = []
-    for label, label_embedding in embedding_service.embedding_store["tags"].items():
-        similarity = embedding_service.calculate_cosine_similarity(doc_embedding, label_embedding)
-        all_tags.append({"tags": label, "similarity": similarity})
-        
-    if not all_tags:
-        return {
-            "emotion_classification": best_classification,
-            "emotion_tags": []
-        }
-        
-    sorted_tags = sorted(all_tags, key=lambda x: x['similarity'], reverse=True)
-    top_tags = [sorted_tags[0]]
-    best_tag_score = sorted_tags[0]['similarity']  
-    threshold = best_tag_score * 0.95
-    
-    candidate_tags = []
-    for tag in sorted_tags[1:]:
-        if tag['similarity'] >= threshold:
-            candidate_tags.append(tag)
-            
-    top_tags.extend(candidate_tags[:2])
+    return results
+
+
+def select_top_tags(tag_scores: np.ndarray) -> list[dict]:
+    if tag_scores.size == 0:
+        return []
+    
+    tag_labels = embedding_service.embedding_store["tags"]["labels"]
+    
+    k = min(MAX_TAGS, tag_scores.size)
+    candidate_indices = np.argpartition(-tag_scores, k - 1)[:k]
+    candidate_indices = candidate_indices[np.argsort(-tag_scores[candidate_indices], kind="stable")]
+    
+    best_tag_score = float(tag_scores[candidate_indices[0]])
+    threshold = best_tag_score * TAG_SIMILARITY_RATIO
+    
+    top_tags = []
+    for rank, index in enumerate(candidate_indices):
+        similarity = float(tag_scores[index])
+        if rank > 0 and similarity < threshold:
+            continue
+        top_tags.append({"tags": tag_labels[index], "similarity": similarity})
     
-    return {
-        "emotion_classification": best_classification,
-        "emotion_tags": top_tags
-    }
+    return top_tags
 
 
-def construct_super_document(
+def construct_document_segments(
     entry_data: EntryData,
     video_emotion: str,
     video_confidence: float,
     image_descriptions: list[dict]
-) -> str:
+) -> list[str]:
     sorted_images = sorted(image_descriptions, key=lambda x: x['position'])
-    paragraphs = entry_data.text.split('\n\n')
+    paragraphs = parse_journal(entry_data.text).blocks
     
     content_parts = []
     content_parts.append(f'Title: {entry_data.title}')
@@ -85,4 +216,4 @@ def construct_super_document(
         content_parts.append(f"[Image Description: {img_desc}]")
         img_idx += 1
         
-    return "\n".join(content_parts)
\ No newline at end of file
+    return content_parts
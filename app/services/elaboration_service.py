@@ -1,13 +1,18 @@
 import json
+import time
+from contextlib import aclosing
 from typing import Optional, Set, Literal
-from langchain.memory.chat_memory import BaseChatMemory
-from langchain.chains import LLMChain
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import SystemMessage, HumanMessage
 from pydantic import BaseModel, Field, model_validator
 
 from ..schemas import ElaborationSuggestion
+from ..logutils.metrics import instrument, record_stage
 from . import model_provider
+from . import upstream
+from .journal_model import parse_journal
+from .memory_service import StructuredJournalHistory
 
 COACHING_STRATEGIES = Literal[
     "Sensory Deepening",
@@ -30,19 +35,55 @@ class ElaborationChoice(BaseModel):
                 raise ValueError("paragraph_index, suggestion_text, and highlight_text are required when strategy is not 'Completion'.")
         return self
 
-def analyze_journal_for_elaboration(
+@instrument("elaboration.analyze_journal_for_elaboration")
+async def aanalyze_journal_for_elaboration(
     journal_text: str,
     excluded_highlights: Set[str],
-    chat_history: BaseChatMemory
+    chat_history: BaseChatMessageHistory
 ) -> Optional[ElaborationSuggestion]:
 
+    chain = _build_elaboration_chain(journal_text, excluded_highlights, _previous_journal_text(chat_history))
+    if chain is None:
+        return None
+
+    try:
+        choice = await upstream.call("llm", chain.ainvoke, {"chat_history": _history_messages(chat_history, journal_text)})
+        return _to_suggestion(choice)
+    except Exception as e:
+        print(f"Error generating elaboration suggestion: {e}")
+        return None
+
+
+def _history_messages(chat_history: BaseChatMessageHistory, current_journal_text: Optional[str] = None):
+    if isinstance(chat_history, StructuredJournalHistory):
+        return chat_history.prompt_messages(current_journal_text=current_journal_text)
+    return chat_history.messages
+
+
+def _previous_journal_text(chat_history: BaseChatMessageHistory) -> Optional[str]:
+    if isinstance(chat_history, StructuredJournalHistory):
+        return chat_history.latest_journal_text()
+    return None
+
+
+def _build_elaboration_chain(journal_text: str, excluded_highlights: Set[str], previous_journal_text: Optional[str] = None):
     llm = model_provider.get_llm(temperature=0.2)
     structured_llm = llm.with_structured_output(ElaborationChoice)
 
-    paragraphs = [p.strip() for p in journal_text.split('\n\n') if p.strip()]
-    if not paragraphs or len(paragraphs) == 0:
+    journal = parse_journal(journal_text)
+    if not journal.paragraphs:
         return None
     
+    # Only changed paragraphs are sent in full; the previous version is already in the history.
+    diff = journal.diff(parse_journal(previous_journal_text).hashes if previous_journal_text else None)
+    latest_intro = "Here is the LATEST version of the journal entry, with each paragraph numbered:\n\n"
+    if diff.is_partial:
+        latest_intro = (
+            "Here is the LATEST version of the journal entry, with each paragraph numbered. "
+            "Paragraphs marked unchanged are identical to the previous version in the conversation history; "
+            "prefer the changed paragraphs unless an unchanged one offers a clearly better opportunity:\n\n"
+        )
+    
     if excluded_highlights:
         excluded_text_list = "\n".join(f"- \"{h}\"" for h in excluded_highlights)
         exclusion_prompt_part = f"""
@@ -76,55 +117,100 @@ def analyze_journal_for_elaboration(
     prompt = ChatPromptTemplate.from_messages([
         SystemMessage(content=system_prompt),
         MessagesPlaceholder(variable_name="chat_history"),
-        HumanMessage(content="Here is the LATEST version of the journal entry, with each paragraph numbered:\n\n" + "\n\n".join(f"Paragraph {i+1}:\n{p}" for i, p in enumerate(paragraphs)))
+        HumanMessage(content=latest_intro + journal.render(diff))
     ])
 
-    chain = prompt | structured_llm
-
-    try:
-        choice = chain.invoke({"chat_history": chat_history.messages})
+    return prompt | structured_llm
 
-        if choice.strategy_used == "Completion":
-            return ElaborationSuggestion(
-                paragraph_index=-1,
-                strategy_used="Completion",
-                suggestion_text="This journal entry is already wonderfully detailed and reflective. Great work!",
-                highlight_text=""
-            )
 
+def _to_suggestion(choice: ElaborationChoice) -> ElaborationSuggestion:
+    if choice.strategy_used == "Completion":
         return ElaborationSuggestion(
-            paragraph_index=choice.paragraph_index,
-            strategy_used=choice.strategy_used,
-            suggestion_text=choice.suggestion_text,
-            highlight_text=choice.highlight_text
+            paragraph_index=-1,
+            strategy_used="Completion",
+            suggestion_text="This journal entry is already wonderfully detailed and reflective. Great work!",
+            highlight_text=""
         )
-    except Exception as e:
-        print(f"Error generating elaboration suggestion: {e}")
-        return None
+
+    return ElaborationSuggestion(
+        paragraph_index=choice.paragraph_index,
+        strategy_used=choice.strategy_used,
+        suggestion_text=choice.suggestion_text,
+        highlight_text=choice.highlight_text
+    )
     
-def generate_ask_response(
-    chat_history: BaseChatMemory,
+ASK_SYSTEM_PROMPT = """
+    You are a helpful and compassionate journaling assistant. Your role is to answer the user's questions based on the context of their journal and our entire conversation so far.
+
+    Use the provided conversation history, which includes both journal analysis ('elaborate' tasks) and previous questions ('ask' tasks), to understand the user's journey. Provide clear, supportive, and relevant answers. Your tone should be encouraging and insightful.
+    """
+
+ASK_ERROR_RESPONSE = "I'm sorry, I encountered an error while trying to respond. Could you please try asking again?"
+
+@instrument("elaboration.generate_ask_response")
+async def agenerate_ask_response(
+    chat_history: BaseChatMessageHistory,
     prompt: str
 ) -> str:
     
-    llm = model_provider.get_llm(temperature=0.4)
+    chain = _build_ask_chain(prompt)
     
-    system_prompt = """
-    You are a helpful and compassionate journaling assistant. Your role is to answer the user's questions based on the context of their journal and our entire conversation so far.
+    try:
+        response = await upstream.call("llm", chain.ainvoke, {"chat_history": _history_messages(chat_history), "input": prompt})
+        return response.content
+    except Exception as e:
+        return ASK_ERROR_RESPONSE
 
-    Use the provided conversation history, which includes both journal analysis ('elaborate' tasks) and previous questions ('ask' tasks), to understand the user's journey. Provide clear, supportive, and relevant answers. Your tone should be encouraging and insightful.
-    """
+
+async def astream_ask_response(
+    chat_history: BaseChatMessageHistory,
+    prompt: str
+):
+    """Yield the answer to an 'ask' prompt chunk by chunk as the model produces it."""
+    chain = _build_ask_chain(prompt)
+    
+    start_time = time.perf_counter()
+    outcome = "error"
+    first_chunk = True
+    try:
+        chunks = upstream.stream("llm", chain.astream, {"chat_history": _history_messages(chat_history), "input": prompt})
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                text = _chunk_text(chunk)
+                if not text:
+                    continue
+                if first_chunk:
+                    record_stage("elaboration.stream_ask_first_token", time.perf_counter() - start_time)
+                    first_chunk = False
+                yield text
+        outcome = "success"
+    except GeneratorExit:
+        outcome = "cancelled"
+        raise
+    finally:
+        record_stage("elaboration.stream_ask_response", time.perf_counter() - start_time, outcome)
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+            if isinstance(part, (str, dict))
+        )
+    return ""
+
+
+def _build_ask_chain(prompt: str):
+    llm = model_provider.get_llm(temperature=0.4)
     
     ask_prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content=system_prompt),
+        SystemMessage(content=ASK_SYSTEM_PROMPT),
         MessagesPlaceholder(variable_name="chat_history"),
         HumanMessage(content=prompt)
     ])
     
-    chain = ask_prompt | llm
-    
-    try:
-        response = chain.invoke({"chat_history": chat_history.messages, "input": prompt})
-        return response.content
-    except Exception as e:
-        return "I'm sorry, I encountered an error while trying to respond. Could you please try asking again?"
\ No newline at end of file
+    return ask_prompt | llm
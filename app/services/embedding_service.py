@@ -1,7 +1,12 @@
-from langchain_openai import OpenAIEmbeddings
+import asyncio
+
+import numpy as np
 from ..config import settings
-from scipy.spatial.distance import cosine
+from ..cache.label_embeddings import LabelEmbeddingCache
+from ..cache.embeddings import EmbeddingCache, content_key
+from ..logutils.metrics import instrument
 from . import model_provider
+from . import upstream
 
 emotion_categories = {
     # --- Positive Emotions ---
@@ -54,42 +59,120 @@ context_tags_map = {
 }
 
 embedding_store = {
-    "classifications": {},
-    "tags": {}
+    "classifications": {"labels": [], "matrix": np.empty((0, 0), dtype=np.float32)},
+    "tags": {"labels": [], "matrix": np.empty((0, 0), dtype=np.float32)}
 }
 
+document_cache = EmbeddingCache(
+    max_entries=settings.DOC_EMBEDDING_CACHE_MAX_ENTRIES,
+    max_bytes=int(settings.DOC_EMBEDDING_CACHE_MAX_MB * 1024 * 1024),
+    disk_path=settings.DOC_EMBEDDING_CACHE_DISK_PATH or None,
+    disk_max_entries=settings.DOC_EMBEDDING_CACHE_DISK_MAX_ENTRIES
+)
+
 def get_embedding_model():
-    if not settings.OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is invalid.")
-    
     model = model_provider.get_embedding_model()
     
     return model
 
-def initialize_embeddings():
+def normalize_rows(vectors) -> np.ndarray:
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+def embed_label_descriptions(texts: list[str]) -> list[list[float]]:
     model = get_embedding_model()
-    
+    return model.embed_documents(texts)
+
+@instrument("embedding.initialize_embeddings")
+def initialize_embeddings():
     emotion_descriptions = list(emotion_categories.values())
     tag_descriptions = list(context_tags_map.values())
     
     all_texts_to_embed = emotion_descriptions + tag_descriptions
     
-    all_embeddings = model.embed_documents(all_texts_to_embed)
+    if settings.EMBEDDING_CACHE_DIR:
+        cache = LabelEmbeddingCache(settings.EMBEDDING_CACHE_DIR, model_provider.get_embedding_model_name())
+        all_embeddings = cache.get_or_embed(all_texts_to_embed, embed_label_descriptions, normalize_rows)
+    else:
+        all_embeddings = normalize_rows(embed_label_descriptions(all_texts_to_embed))
     
     num_emotion_categories = len(emotion_categories)
     
-    emotion_labels = list(emotion_categories.keys())
-    for i, label in enumerate(emotion_labels):
-        embedding_store['classifications'][label] = all_embeddings[i]
-        
-    tag_embeddings = all_embeddings[num_emotion_categories:]
-    tag_labels = list(context_tags_map.keys())
-    for i, label in enumerate(tag_labels):
-        embedding_store["tags"][label] = tag_embeddings[i]
-
-def embed_document(text: str) -> list[float]:
+    embedding_store["classifications"] = {
+        "labels": list(emotion_categories.keys()),
+        "matrix": all_embeddings[:num_emotion_categories]
+    }
+    embedding_store["tags"] = {
+        "labels": list(context_tags_map.keys()),
+        "matrix": all_embeddings[num_emotion_categories:]
+    }
+
+@instrument("embedding.embed_document")
+async def aembed_document(text: str) -> np.ndarray:
+    key = content_key(text, model_provider.get_embedding_model_name(), "query")
+    cached = await document_cache.aget(key)
+    if cached is not None:
+        return cached
+    
     model = get_embedding_model()
-    return model.embed_query(text)
+    vector = await upstream.call("embedding", model.aembed_query, text)
+    return await document_cache.aset(key, vector)
+
+@instrument("embedding.embed_documents")
+async def aembed_documents(texts: list[str]) -> list[np.ndarray]:
+    if not texts:
+        return []
+    
+    keys = [content_key(text, model_provider.get_embedding_model_name(), "document") for text in texts]
+    vectors = await document_cache.aget_many(keys)
+    
+    missing = {}
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(texts[i], []).append(i)
+    if not missing:
+        return vectors
+    
+    model = get_embedding_model()
+    new_vectors = await upstream.call("embedding", model.aembed_documents, list(missing.keys()))
+    for text, vector in zip(missing.keys(), new_vectors):
+        for i in missing[text]:
+            vectors[i] = await document_cache.aset(keys[i], vector)
+    return vectors
+
+def compose_document_vector(segment_vectors, weights) -> np.ndarray:
+    """Weighted mean of unit-normalized segment vectors."""
+    vectors = normalize_rows(segment_vectors)
+    weights = np.asarray(weights, dtype=np.float32)
+    return (weights[:, None] * vectors).sum(axis=0) / weights.sum()
+
+def _content_segments(segments: list[str]) -> list[str]:
+    segments = [segment for segment in segments if segment.strip()]
+    if not segments:
+        raise ValueError("Document has no content to embed.")
+    return segments
+
+@instrument("embedding.embed_segments")
+async def aembed_segments(segments: list[str]) -> np.ndarray:
+    """Embed each segment (cached by content) and compose a length-weighted document vector."""
+    segments = _content_segments(segments)
+    batches = await asyncio.gather(*(aembed_documents(batch) for _, batch in iter_batches(segments)))
+    vectors = [vector for batch in batches for vector in batch]
+    return compose_document_vector(vectors, [len(segment) for segment in segments])
+
+def get_document_cache_stats() -> dict:
+    return document_cache.stats()
+
+def iter_batches(items: list, batch_size: int = None):
+    batch_size = max(1, batch_size or settings.EMBEDDING_BATCH_SIZE)
+    for start in range(0, len(items), batch_size):
+        yield start, items[start:start + batch_size]
 
-def calculate_cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
-    return 1 - cosine(vec1, vec2)
\ No newline at end of file
+def score_label_matrix(doc_embeddings, store_key: str) -> np.ndarray:
+    matrix = embedding_store[store_key]["matrix"]
+    documents = normalize_rows(doc_embeddings)
+    if matrix.size == 0:
+        return np.empty((documents.shape[0], 0), dtype=np.float32)
+    return documents @ matrix.T
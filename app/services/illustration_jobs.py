@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Dict, Optional
+
+from ..config import settings
+from ..schemas import IllustrationRequest
+from . import illustration_service
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class QueueFullError(Exception):
+    pass
+
+class IllustrationJob:
+    def __init__(self, job_id: str, key: str, payload: IllustrationRequest):
+        self.job_id = job_id
+        self.key = key
+        self.payload = payload
+        self.status = QUEUED
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.attached_requests = 0
+        self.done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "queue_ms": int(((self.started_at or end) - self.created_at) * 1000),
+            "run_ms": int((end - self.started_at) * 1000) if self.started_at else None,
+        }
+
+def job_key(payload: IllustrationRequest) -> str:
+    """Identity of the work a request asks for; identical submissions share one job."""
+    identity = {
+        "journal_id": payload.journal_id,
+        "journal_text": payload.journal_text,
+        "user_id": payload.user_id,
+        "style_preference": payload.style_preference,
+        "num_images": payload.num_images,
+        "filled_paragraph": sorted(payload.filled_paragraph or []),
+        "regenerate": payload.regenerate,
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+class IllustrationJobQueue:
+    """In-process job queue that runs the illustration pipeline on a bounded worker pool."""
+
+    def __init__(self, workers: int, max_queued: int, ttl_seconds: float):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, IllustrationJob] = {}
+        self._in_flight: Dict[str, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"illustration-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, payload: IllustrationRequest) -> tuple[IllustrationJob, bool]:
+        """Queue a job, or return the in-flight job for an identical request.
+
+        Returns the job and whether it was newly created.
+        """
+        if self._queue is None:
+            raise RuntimeError("Illustration job queue is not running.")
+        self._prune()
+
+        key = job_key(payload)
+        existing_id = self._in_flight.get(key)
+        if existing_id is not None:
+            job = self._jobs[existing_id]
+            job.attached_requests += 1
+            self.deduplicated += 1
+            return job, False
+
+        if self._queue.qsize() >= self.max_queued:
+            self.rejected += 1
+            raise QueueFullError("Too many illustration jobs are queued; try again later.")
+
+        job = IllustrationJob(uuid.uuid4().hex, key, payload)
+        self._jobs[job.job_id] = job
+        self._in_flight[key] = job.job_id
+        self._queue.put_nowait(job)
+        self.submitted += 1
+        return job, True
+
+    def get(self, job_id: str) -> Optional[IllustrationJob]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: IllustrationJob, timeout: float):
+        if timeout <= 0 or job.finished:
+            return
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> dict:
+        statuses = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            statuses[job.status] += 1
+        return {
+            "workers": self.workers,
+            "queued": statuses[QUEUED],
+            "running": statuses[RUNNING],
+            "retained_finished": statuses[SUCCEEDED] + statuses[FAILED],
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+        }
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IllustrationJob):
+        job.status = RUNNING
+        job.started_at = time.time()
+        payload = job.payload
+        try:
+            job.result = await illustration_service.arun_illustration_pipeline(
+                journal_text=payload.journal_text,
+                style_preference=payload.style_preference,
+                num_images=payload.num_images,
+                user_id=payload.user_id,
+                journal_id=payload.journal_id,
+                filled_paragraph=payload.filled_paragraph,
+                regenerate=payload.regenerate,
+            )
+            job.status = SUCCEEDED
+            self.succeeded += 1
+        except Exception as e:
+            print(f"Illustration job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+            self.failed += 1
+        finally:
+            job.finished_at = time.time()
+            if self._in_flight.get(job.key) == job.job_id:
+                del self._in_flight[job.key]
+            job.done.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+job_queue = IllustrationJobQueue(
+    workers=settings.ILLUSTRATION_JOB_WORKERS,
+    max_queued=settings.ILLUSTRATION_JOB_QUEUE_MAX,
+    ttl_seconds=settings.ILLUSTRATION_JOB_TTL_SECONDS,
+)
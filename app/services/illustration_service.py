@@ -1,11 +1,19 @@
+import asyncio
 import json
 import base64
+import hashlib
 from . import model_provider
 from pydantic import BaseModel, Field
 from typing import List
 from langchain_core.messages import HumanMessage, SystemMessage
+from ..cache.lru import LRUCache
+from ..cache.tiered import JSONTieredCache
 from ..config import settings
+from ..logutils.metrics import PARAGRAPH_SHORTLIST_DECISIONS, instrument
 from . import model_provider
+from . import paragraph_ranker
+from .journal_model import parse_journal
+from . import upstream
 
 from app.cloud.storage_client import (
     build_illustration_blob_path,
@@ -13,6 +21,24 @@ from app.cloud.storage_client import (
     upload_bytes_to_bucket,
 )
 
+illustration_cache = JSONTieredCache(
+    LRUCache(
+        max_entries=settings.ILLUSTRATION_CACHE_MAX_ENTRIES,
+        max_bytes=int(settings.ILLUSTRATION_CACHE_MAX_MB * 1024 * 1024),
+        sizeof=lambda item: len(str(item)),
+    ),
+    disk_path=settings.ILLUSTRATION_CACHE_DISK_PATH or None,
+    table="illustrations",
+    disk_max_entries=settings.ILLUSTRATION_CACHE_MAX_ENTRIES * 10,
+    ttl_seconds=settings.ILLUSTRATION_CACHE_TTL_SECONDS,
+)
+
+# Last paragraph chosen per user/journal, so later requests only weigh edited paragraphs against it.
+illustration_choices = LRUCache(
+    max_entries=settings.ILLUSTRATION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ILLUSTRATION_CACHE_TTL_SECONDS,
+)
+
 class VisualEssence(BaseModel):
     """A list of concise descriptive phrases representing the visual essence of a text."""
     visual_elements: List[str] = Field(
@@ -20,73 +46,221 @@ class VisualEssence(BaseModel):
         description="A list of strings, where each string is a concise descriptive phrase of a visual element (subject, object, setting, action) from the text."
     )
 
-def identify_illustrable_paragraph(journal_text: str) -> str:
+# Prompt blocks shared by the two-step and fused planning prompts.
+PARAGRAPH_SELECTION_CRITERIA = """the single paragraph that is the most visually descriptive and suitable for creating an illustration. 
+        Consider paragraphs with concrete nouns, actions, and sensory details."""
+
+VISUAL_ELEMENTS_TASK = "identify the key visual elements (subjects, objects, setting, actions)."
+
+VISUAL_SAFETY_RULES = """**IMPORTANT SAFETY RULE:** Your primary goal is to interpret the user's text in a way that is safe for an AI image generator.
+        - **DO NOT** extract any elements that depict or imply self-harm, violence, gore, explicit adult content, or hate symbols.
+        - If the text contains sensitive themes, rephrase them into abstract or symbolic representations. For example, instead of "a bloody knife," extract "a crimson object casting a long shadow." Instead of a violent act, describe the emotional aftermath, like "a sense of turmoil represented by stormy clouds."
+        - Focus on creating a visually rich and emotionally resonant scene that is artistic and G-rated."""
+
+@instrument("illustration.identify_illustrable_paragraph")
+async def aidentify_illustrable_paragraph(journal_text: str, scope: str = None) -> str:
+    paragraphs, candidates = _shortlist_paragraphs(journal_text, scope)
+    if len(candidates) == 1:
+        return paragraphs[candidates[0] - 1], candidates[0]
+    
+    messages = _build_paragraph_selection_messages(paragraphs, candidates)
+    llm = model_provider.get_llm(temperature=0.0)
     
-    paragraphs = [p.strip() for p in journal_text.split('\n\n') if p.strip()]
+    try:
+        response = await upstream.call("llm", llm.ainvoke, messages)
+        return _parse_paragraph_selection(response, paragraphs, candidates)
+
+    except (ValueError, TypeError) as e:
+        raise Exception(f"Failed to parse a valid paragraph number from LLM response: {e}")
+    except Exception as e:
+        raise Exception(f"Failed to identify illustrable paragraph: {e}")
+
+
+def _shortlist_paragraphs(journal_text: str, scope: str = None) -> tuple[list[str], list[int]]:
+    journal = parse_journal(journal_text)
+    paragraphs = list(journal.paragraphs)
     if not paragraphs:
         raise ValueError("Journal text is empty or contains no valid paragraphs.")
     
+    eligible = _eligible_positions(journal, scope)
+    if not settings.PARAGRAPH_RANKER_ENABLED:
+        return paragraphs, eligible
+    
+    shortlisted = paragraph_ranker.shortlist_paragraphs(
+        [paragraphs[position - 1] for position in eligible],
+        max_candidates=settings.PARAGRAPH_RANKER_MAX_CANDIDATES,
+        confidence_margin=settings.PARAGRAPH_RANKER_CONFIDENCE_MARGIN,
+    )
+    candidates = [eligible[i - 1] for i in shortlisted]
+    PARAGRAPH_SHORTLIST_DECISIONS.inc("local" if len(candidates) == 1 else "llm")
+    return paragraphs, candidates
+
+
+def _eligible_positions(journal, scope: str = None) -> list[int]:
+    all_positions = list(range(1, len(journal) + 1))
+    previous = illustration_choices.get(scope) if scope else None
+    if previous is None:
+        return all_positions
+    
+    diff = journal.diff(previous["hashes"])
+    previous_choice = previous["hashes"][previous["position"] - 1]
+    kept = {position for position, h in enumerate(journal.hashes, 1) if h == previous_choice}
+    if not kept:
+        # The chosen paragraph was edited or removed, so the earlier comparison no longer holds.
+        return all_positions
+    
+    if not diff.changed:
+        # Nothing new to weigh against the previous choice.
+        return [previous["position"] if previous["position"] in kept else min(kept)]
+    
+    # Unchanged paragraphs already lost to the still-present choice; only edits can beat it.
+    return sorted(set(diff.changed) | kept)
+
+
+def illustration_scope(user_id: str, journal_id: str) -> str:
+    return hashlib.sha256(json.dumps([user_id, journal_id]).encode("utf-8")).hexdigest()
+
+
+def _remember_choice(scope: str, journal_text: str, position: int):
+    if scope:
+        illustration_choices.set(scope, {"hashes": parse_journal(journal_text).hashes, "position": position})
+
+
+def _candidate_numbering(paragraphs: list[str], candidates: list[int]) -> tuple[str, str]:
     numbered_journal_text = ""
-    for i, p in enumerate(paragraphs):
-        numbered_journal_text += f"Paragraph {i + 1}:\n{p}\n\n"
+    for position in candidates:
+        numbered_journal_text += f"Paragraph {position}:\n{paragraphs[position - 1]}\n\n"
+    
+    if len(candidates) == len(paragraphs):
+        count_note = f"There are {len(paragraphs)} paragraphs in total."
+    else:
+        count_note = (
+            f"Only {len(candidates)} candidate paragraphs out of {len(paragraphs)} are shown, "
+            f"numbered by their position in the entry. Choose one of: {', '.join(str(p) for p in candidates)}."
+        )
+    return numbered_journal_text, count_note
+
+
+def _build_paragraph_selection_messages(paragraphs: list[str], candidates: list[int]) -> list:
+    numbered_journal_text, count_note = _candidate_numbering(paragraphs, candidates)
 
-    llm = model_provider.get_llm(temperature=0.0)
     system_message = SystemMessage(
         content=f"""You are an expert in visual storytelling. Your task is to analyze the following journal entry, which is split into numbered paragraphs. 
-        Identify the single paragraph that is the most visually descriptive and suitable for creating an illustration. 
-        Consider paragraphs with concrete nouns, actions, and sensory details.
+        Identify {PARAGRAPH_SELECTION_CRITERIA}
         
         Your response must be ONLY the number of the chosen paragraph (e.g., '2'). Do not include any other text, punctuation, or explanation.
-        There are {len(paragraphs)} paragraphs in total."""
+        {count_note}"""
     )
     human_message = HumanMessage(content=numbered_journal_text)
-    
-    try:
-        response = llm.invoke([system_message, human_message])
-        paragraph_number = int(response.content.strip())
+    return [system_message, human_message]
 
-        if not (1 <= paragraph_number <= len(paragraphs)):
-            raise ValueError(f"LLM returned an invalid paragraph number: {paragraph_number}")
 
-        position = paragraph_number
-        chosen_paragraph = paragraphs[position - 1]
-        
-        return chosen_paragraph, position
+def _parse_paragraph_selection(response, paragraphs: list[str], candidates: list[int]) -> tuple[str, int]:
+    paragraph_number = int(response.content.strip())
 
-    except (ValueError, TypeError) as e:
-        raise Exception(f"Failed to parse a valid paragraph number from LLM response: {e}")
-    except Exception as e:
-        raise Exception(f"Failed to identify illustrable paragraph: {e}")
+    if paragraph_number not in candidates:
+        raise ValueError(f"LLM returned an invalid paragraph number: {paragraph_number}")
 
+    position = paragraph_number
+    chosen_paragraph = paragraphs[position - 1]
+    
+    return chosen_paragraph, position
 
-def extract_visual_essence(paragraph: str) -> list[str]:
 
-    llm = model_provider.get_llm(temperature=0.2)
-    structured_llm = llm.with_structured_output(VisualEssence)
-    
-    system_message = SystemMessage(
-        content="""You are an expert in extracting visual details from text for an art generation model.
-        From the given paragraph, identify the key visual elements (subjects, objects, setting, actions).
+VISUAL_ESSENCE_SYSTEM_PROMPT = f"""You are an expert in extracting visual details from text for an art generation model.
+        From the given paragraph, {VISUAL_ELEMENTS_TASK}
 
-        **IMPORTANT SAFETY RULE:** Your primary goal is to interpret the user's text in a way that is safe for an AI image generator.
-        - **DO NOT** extract any elements that depict or imply self-harm, violence, gore, explicit adult content, or hate symbols.
-        - If the text contains sensitive themes, rephrase them into abstract or symbolic representations. For example, instead of "a bloody knife," extract "a crimson object casting a long shadow." Instead of a violent act, describe the emotional aftermath, like "a sense of turmoil represented by stormy clouds."
-        - Focus on creating a visually rich and emotionally resonant scene that is artistic and G-rated.
+        {VISUAL_SAFETY_RULES}
 
         Return these safe and rephrased elements as a JSON array of strings. Each string should be a concise descriptive phrase.
         Example output: ["a person sitting on a park bench", "autumn leaves falling", "a red scarf", "a distant city skyline"]
         Return ONLY the JSON array."""
-    )
 
-    human_message = HumanMessage(content=paragraph)
+
+@instrument("illustration.extract_visual_essence")
+async def aextract_visual_essence(paragraph: str) -> list[str]:
+
+    llm = model_provider.get_llm(temperature=0.2)
+    structured_llm = llm.with_structured_output(VisualEssence)
+    
+    messages = [SystemMessage(content=VISUAL_ESSENCE_SYSTEM_PROMPT), HumanMessage(content=paragraph)]
     
     try:
-        response = structured_llm.invoke([system_message, human_message])
+        response = await upstream.call("llm", structured_llm.ainvoke, messages)
         return response.visual_elements
         
     except (json.JSONDecodeError, ValueError, Exception) as e:
         raise Exception(f"Failed to extract visual essence: {e}")
 
+class IllustrationPlan(BaseModel):
+    """The paragraph chosen for illustration and its safe visual elements."""
+    paragraph_number: int = Field(
+        ...,
+        description="The 1-based number of the single most visually descriptive paragraph."
+    )
+    visual_elements: List[str] = Field(
+        ...,
+        description="Concise, safe descriptive phrases of the visual elements (subject, object, setting, action) of the chosen paragraph."
+    )
+
+FUSED_PLANNING_SYSTEM_PROMPT = f"""You are an expert in visual storytelling and in extracting visual details from text for an art generation model.
+        You will receive a journal entry split into numbered paragraphs. In a single answer:
+        1. Choose {PARAGRAPH_SELECTION_CRITERIA}
+        2. From that paragraph only, {VISUAL_ELEMENTS_TASK}
+
+        {VISUAL_SAFETY_RULES}
+
+        Return `paragraph_number` and `visual_elements`, each element being a concise descriptive phrase."""
+
+
+async def aplan_illustration(journal_text: str, scope: str = None) -> tuple[str, int, list[str]]:
+    """Return the chosen paragraph, its 1-based position and its visual elements.
+
+    With a ``scope`` (user and journal), the choice is remembered and the next
+    plan for an edited version only weighs changed paragraphs against it.
+    """
+    if settings.ILLUSTRATION_PLANNING_MODE == "fused":
+        illustrable_paragraph, position, visual_essence = await _aplan_illustration_fused(journal_text, scope)
+    else:
+        illustrable_paragraph, position = await aidentify_illustrable_paragraph(journal_text, scope)
+        visual_essence = await aextract_visual_essence(illustrable_paragraph)
+    
+    _remember_choice(scope, journal_text, position)
+    return illustrable_paragraph, position, visual_essence
+
+
+@instrument("illustration.plan_illustration_fused")
+async def _aplan_illustration_fused(journal_text: str, scope: str = None) -> tuple[str, int, list[str]]:
+    paragraphs, candidates = _shortlist_paragraphs(journal_text, scope)
+    if len(candidates) == 1:
+        paragraph = paragraphs[candidates[0] - 1]
+        return paragraph, candidates[0], await aextract_visual_essence(paragraph)
+    
+    messages = _build_fused_planning_messages(paragraphs, candidates)
+    structured_llm = model_provider.get_llm(temperature=0.0).with_structured_output(IllustrationPlan)
+    
+    try:
+        plan = await upstream.call("llm", structured_llm.ainvoke, messages)
+        return _parse_illustration_plan(plan, paragraphs, candidates)
+    except Exception as e:
+        raise Exception(f"Failed to plan illustration: {e}")
+
+
+def _build_fused_planning_messages(paragraphs: list[str], candidates: list[int]) -> list:
+    numbered_journal_text, count_note = _candidate_numbering(paragraphs, candidates)
+    system_message = SystemMessage(content=FUSED_PLANNING_SYSTEM_PROMPT + f"\n        {count_note}")
+    return [system_message, HumanMessage(content=numbered_journal_text)]
+
+
+def _parse_illustration_plan(plan: IllustrationPlan, paragraphs: list[str], candidates: list[int]) -> tuple[str, int, list[str]]:
+    if plan.paragraph_number not in candidates:
+        raise ValueError(f"LLM returned an invalid paragraph number: {plan.paragraph_number}")
+    if not plan.visual_elements:
+        raise ValueError("LLM returned no visual elements.")
+    
+    return paragraphs[plan.paragraph_number - 1], plan.paragraph_number, plan.visual_elements
+
+
 def assemble_illustration_prompt(
     visual_essence: list[str], 
     style_preference: str
@@ -101,39 +275,112 @@ def assemble_illustration_prompt(
     
     return prompt
 
-def generate_illustration(
+@instrument("illustration.generate_illustration")
+async def agenerate_illustration(
     prompt: str,
     num_images: int,
     user_id: str,
     journal_id: str,
+    style_preference: str = None,
+    regenerate: bool = False,
 ) -> list[str]:
-    model = model_provider.get_imagen_model()
-    response = model.generate_images(
+    cache_key = _illustration_cache_key(prompt, style_preference, num_images, user_id, journal_id)
+    if not regenerate:
+        cached_urls = await illustration_cache.aget(cache_key)
+        if cached_urls is not None:
+            return cached_urls
+
+    model = await upstream.run_blocking("imagen", model_provider.get_imagen_model)
+    response = await upstream.run_blocking(
+        "imagen",
+        model.generate_images,
         prompt=prompt,
         number_of_images=num_images,
     )
 
+    uploads = [_prepare_upload(generated, user_id, journal_id) for generated in _generated_items(response)]
+
+    uploaded_urls = await asyncio.gather(
+        *(upstream.run_blocking("gcs", upload_bytes_to_bucket, *upload) for upload in uploads)
+    )
+
+    if not uploaded_urls:
+        raise RuntimeError("No valid images were produced for upload.")
+
+    return await illustration_cache.aset(cache_key, list(uploaded_urls))
+
+def get_illustration_cache_stats() -> dict:
+    return illustration_cache.stats()
+
+def _illustration_cache_key(prompt: str, style_preference: str, num_images: int, user_id: str, journal_id: str) -> str:
+    # Hash a structured value so that no field can spill into another one.
+    identity = json.dumps([user_id, journal_id, style_preference, num_images, prompt])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+def _generated_items(response) -> list:
     generated_items = response.images if hasattr(response, "images") else response
     
     if not generated_items:
         raise RuntimeError("Image generation returned no images to upload.")
+    return generated_items
 
-    uploaded_urls: list[str] = []
+def _prepare_upload(generated, user_id: str, journal_id: str) -> tuple[bytes, str, str]:
+    image_bytes = getattr(generated, "_image_bytes", None)
 
-    for generated in generated_items:
-        image_bytes = getattr(generated, "_image_bytes", None)
+    mime_type = getattr(generated, "mime_type", "image/png")
+    extension = "png" if "png" in mime_type else "jpg"
 
-        mime_type = getattr(generated, "mime_type", "image/png")
-        extension = "png" if "png" in mime_type else "jpg"
+    filename = generate_hashed_filename(extension)
+    blob_path = build_illustration_blob_path(user_id, journal_id, filename)
+    return image_bytes, blob_path, mime_type
 
-        filename = generate_hashed_filename(extension)
-        blob_path = build_illustration_blob_path(user_id, journal_id, filename)
-        
-        public_url = upload_bytes_to_bucket(image_bytes, blob_path, mime_type)
 
-        uploaded_urls.append(public_url)
+def resolve_illustration_position(position: int, total_paragraphs: int, filled_paragraph) -> int:
+    """Place the illustration after the chosen paragraph, or the nearest free one."""
+    filled_positions = set(filled_paragraph or [])
+    for i in range(position, 0, -1):
+        if i not in filled_positions:
+            return i
 
-    if not uploaded_urls:
-        raise RuntimeError("No valid images were produced for upload.")
+    for i in range(position + 1, total_paragraphs + 1):
+        if i not in filled_positions:
+            return i
+
+    return 0
+
+
+async def arun_illustration_pipeline(
+    journal_text: str,
+    style_preference: str,
+    num_images: int,
+    user_id: str,
+    journal_id: str,
+    filled_paragraph=None,
+    regenerate: bool = False,
+) -> dict:
+    """Plan, generate and upload an illustration; returns images, prompt and position."""
+    illustrable_paragraph, position, visual_essence = await aplan_illustration(
+        journal_text, scope=illustration_scope(user_id, journal_id)
+    )
+
+    final_position = resolve_illustration_position(position, len(parse_journal(journal_text)), filled_paragraph)
+
+    final_prompt = assemble_illustration_prompt(
+        visual_essence=visual_essence,
+        style_preference=style_preference,
+    )
+
+    generated_images = await agenerate_illustration(
+        prompt=final_prompt,
+        num_images=num_images,
+        user_id=user_id,
+        journal_id=journal_id,
+        style_preference=style_preference,
+        regenerate=regenerate,
+    )
 
-    return uploaded_urls
\ No newline at end of file
+    return {
+        "images": generated_images,
+        "prompt": final_prompt,
+        "position_after_paragraph": final_position,
+    }
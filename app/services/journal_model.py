@@ -0,0 +1,77 @@
+import functools
+import hashlib
+from typing import Optional, Sequence
+
+PARAGRAPH_SEPARATOR = "\n\n"
+PREVIEW_WORDS = 8
+
+def paragraph_hash(paragraph: str) -> str:
+    return hashlib.sha256(paragraph.encode("utf-8")).hexdigest()[:16]
+
+class JournalDiff:
+    """Paragraph-level changes of a journal against a previously seen version.
+
+    Positions are 1-based. ``previous_positions`` maps each unchanged
+    paragraph to its position in the previous version.
+    """
+
+    def __init__(self, changed: list[int], previous_positions: dict[int, int], has_previous: bool):
+        self.changed = changed
+        self.previous_positions = previous_positions
+        self.has_previous = has_previous
+
+    @property
+    def is_partial(self) -> bool:
+        """True when some, but not all, paragraphs changed since the previous version."""
+        return self.has_previous and bool(self.changed) and bool(self.previous_positions)
+
+class ParsedJournal:
+    """A journal split into paragraphs once, with a content hash per paragraph."""
+
+    def __init__(self, text: str):
+        self.text = text
+        # Raw blocks keep empty and unstripped pieces; image positions index into them.
+        self.blocks = tuple(text.split(PARAGRAPH_SEPARATOR))
+        self.paragraphs = tuple(p.strip() for p in self.blocks if p.strip())
+        self.hashes = tuple(paragraph_hash(p) for p in self.paragraphs)
+
+    def __len__(self) -> int:
+        return len(self.paragraphs)
+
+    def diff(self, previous_hashes: Optional[Sequence[str]]) -> JournalDiff:
+        if not previous_hashes:
+            return JournalDiff(list(range(1, len(self.paragraphs) + 1)), {}, False)
+
+        previous_index = {}
+        for i, h in enumerate(previous_hashes):
+            previous_index.setdefault(h, i + 1)
+
+        changed = []
+        previous_positions = {}
+        for i, h in enumerate(self.hashes):
+            if h in previous_index:
+                previous_positions[i + 1] = previous_index[h]
+            else:
+                changed.append(i + 1)
+        return JournalDiff(changed, previous_positions, True)
+
+    def render(self, diff: Optional[JournalDiff] = None) -> str:
+        """Number every paragraph; unchanged ones become short references when only some changed."""
+        parts = []
+        for i, p in enumerate(self.paragraphs):
+            position = i + 1
+            if diff is not None and diff.is_partial and position in diff.previous_positions:
+                words = p.split()
+                preview = " ".join(words[:PREVIEW_WORDS]) + (" ..." if len(words) > PREVIEW_WORDS else "")
+                parts.append(
+                    f"Paragraph {position}: (unchanged, same as paragraph "
+                    f"{diff.previous_positions[position]} of the previous version: \"{preview}\")"
+                )
+            else:
+                parts.append(f"Paragraph {position}:\n{p}")
+        return PARAGRAPH_SEPARATOR.join(parts)
+
+@functools.lru_cache(maxsize=256)
+def parse_journal(text: str) -> ParsedJournal:
+    """Parse a journal; repeated calls with the same text within a request reuse the result."""
+    return ParsedJournal(text)
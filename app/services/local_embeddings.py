@@ -0,0 +1,51 @@
+import re
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+class HashingEmbeddings(Embeddings):
+    """CPU-only embeddings from signed feature hashing of words and word bigrams.
+
+    Needs no downloads or network and is deterministic across processes, which
+    makes it usable offline and for load tests. Vectors are L2-normalized.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+        self.model_name = f"local-hashing-{dimensions}"
+
+    def _features(self, text: str) -> list[str]:
+        words = TOKEN_PATTERN.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        features = self._features(text)
+        if not features:
+            return vector
+
+        hashes = np.array([zlib.crc32(f.encode("utf-8")) for f in features], dtype=np.uint32)
+        buckets = hashes % self.dimensions
+        # Use a bit that is independent of the bucket to pick the sign.
+        signs = np.where((hashes >> 31) & 1, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, buckets, signs)
+
+        # Sublinear term frequency keeps repeated words from dominating.
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text).tolist()
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
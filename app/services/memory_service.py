@@ -1,17 +1,41 @@
+import hashlib
 import json
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 
+from ..config import settings
 from ..schemas import JournalData, ElaborationSuggestion
 
+SUMMARY_MAX_ITEMS = 10
+SUMMARY_ITEM_MAX_CHARS = 120
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text.
+    return len(text) // 4 + 1
+
+def journal_version_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
 class StructuredJournalHistory(BaseChatMessageHistory, BaseModel):
+    """Chat history that stores each journal version once, keyed by hash.
+
+    Human messages reference the journal by version key; the text is only
+    expanded when prompt messages are rendered.
+    """
+
     messages: List[BaseMessage] = Field(default_factory=list)
-    
+    journal_versions: Dict[str, str] = Field(default_factory=dict)
+
     def _format_message_content(self, data: dict) -> str:
-        return json.dumps(data, indent=2)
-    
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    def _add_journal_version(self, text: str) -> str:
+        key = journal_version_key(text)
+        self.journal_versions.setdefault(key, text)
+        return key
+
     def add_elaborate_interaction(
         self,
         journal_data: JournalData,
@@ -19,17 +43,17 @@ class StructuredJournalHistory(BaseChatMessageHistory, BaseModel):
     ):
         human_content = self._format_message_content({
             "task": "elaborate",
-            "journal_text": journal_data.text
+            "journal": self._add_journal_version(journal_data.text)
         })
         self.add_user_message(human_content)
-        
+
         ai_content = self._format_message_content({
             "strategy_used": suggestion.strategy_used,
             "suggestion_text": suggestion.suggestion_text,
             "highlight_text": suggestion.highlight_text
         })
         self.add_ai_message(ai_content)
-        
+
     def add_ask_interaction(
         self,
         journal_data: JournalData,
@@ -38,21 +62,132 @@ class StructuredJournalHistory(BaseChatMessageHistory, BaseModel):
     ):
         human_content = self._format_message_content({
             "task": "ask",
-            "journal_text": journal_data.text,
+            "journal": self._add_journal_version(journal_data.text),
             "prompt": prompt
         })
         self.add_user_message(human_content)
-        
+
         ai_content = self._format_message_content({
             "assistant_response": assistant_response
         })
         self.add_ai_message(ai_content)
-        
+
     def add_messages(
         self,
         messages: List[BaseMessage]
     ) -> None:
         self.messages.extend(messages)
-        
+
     def clear(self) -> None:
-        self.messages = []
\ No newline at end of file
+        self.messages = []
+        self.journal_versions = {}
+
+    def latest_journal_text(self) -> Optional[str]:
+        for message in reversed(self.messages):
+            if not isinstance(message, HumanMessage):
+                continue
+            data = _parse_content(message)
+            if data and data.get("journal") in self.journal_versions:
+                return self.journal_versions[data["journal"]]
+        return None
+
+    def prompt_messages(
+        self,
+        max_tokens: int = None,
+        current_journal_text: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """Render the most recent turns that fit in ``max_tokens``.
+
+        Each journal version is written out once, at its first appearance in
+        the window; older turns that do not fit are folded into a short
+        summary message.
+        """
+        if max_tokens is None:
+            max_tokens = settings.CHAT_HISTORY_MAX_TOKENS
+        current_key = journal_version_key(current_journal_text) if current_journal_text else None
+
+        turns = [self.messages[i:i + 2] for i in range(0, len(self.messages), 2)]
+        window_start = len(turns)
+        while window_start > 0:
+            candidate = self._render_turns(turns[window_start - 1:], current_key)
+            cost = sum(estimate_tokens(message.content) for message in candidate)
+            # The latest turn is always kept, even when it alone exceeds the budget.
+            if cost > max_tokens and window_start < len(turns):
+                break
+            window_start -= 1
+
+        rendered = self._render_turns(turns[window_start:], current_key)
+        if window_start > 0:
+            rendered.insert(0, self._summarize_turns(turns[:window_start]))
+        return rendered
+
+    def _render_turns(self, turns: List[List[BaseMessage]], current_key: Optional[str]) -> List[BaseMessage]:
+        rendered = []
+        previous_key = None
+        for turn in turns:
+            for message in turn:
+                data = _parse_content(message)
+                if not isinstance(message, HumanMessage) or data is None or "journal" not in data:
+                    rendered.append(message)
+                    continue
+
+                key = data.pop("journal")
+                if key == current_key:
+                    data["journal_text"] = "(same as the LATEST version below)"
+                elif key == previous_key:
+                    data["journal_text"] = "(unchanged since the previous message)"
+                else:
+                    data["journal_text"] = self.journal_versions.get(key, "(unavailable)")
+                previous_key = key
+                rendered.append(HumanMessage(content=self._format_message_content(data)))
+        return rendered
+
+    def _summarize_turns(self, turns: List[List[BaseMessage]]) -> SystemMessage:
+        # Ordered dicts drop repeats; a repeated item moves to its latest
+        # position so the most recent items survive the SUMMARY_MAX_ITEMS cap.
+        highlights = {}
+        questions = {}
+        for turn in turns:
+            for message in turn:
+                data = _parse_content(message) or {}
+                if data.get("highlight_text"):
+                    _append_unique(highlights, data["highlight_text"][:SUMMARY_ITEM_MAX_CHARS])
+                if data.get("prompt"):
+                    _append_unique(questions, data["prompt"][:SUMMARY_ITEM_MAX_CHARS])
+
+        lines = [f"Summary of {len(turns)} earlier turns of this conversation that are not shown:"]
+        if highlights:
+            lines.append("Phrases already elaborated on: " + "; ".join(list(highlights)[-SUMMARY_MAX_ITEMS:]))
+        if questions:
+            lines.append("Questions the user asked: " + "; ".join(list(questions)[-SUMMARY_MAX_ITEMS:]))
+        return SystemMessage(content="\n".join(lines))
+
+    def to_dict(self) -> dict:
+        return {
+            "messages": [
+                ["ai" if isinstance(message, AIMessage) else "human", message.content]
+                for message in self.messages
+            ],
+            "journal_versions": self.journal_versions,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StructuredJournalHistory":
+        return cls(
+            messages=[
+                AIMessage(content=content) if role == "ai" else HumanMessage(content=content)
+                for role, content in data.get("messages", [])
+            ],
+            journal_versions=data.get("journal_versions", {}),
+        )
+
+def _append_unique(items: dict, item: str):
+    items.pop(item, None)
+    items[item] = None
+
+def _parse_content(message: BaseMessage) -> Optional[dict]:
+    try:
+        data = json.loads(message.content)
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
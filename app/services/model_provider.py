@@ -1,31 +1,147 @@
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-import vertexai
-from vertexai.vision_models import ImageGenerationModel
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING
 
 from ..config import settings
 
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+    from vertexai.vision_models import ImageGenerationModel
+    from .local_embeddings import HashingEmbeddings
+
+LLM_MODEL_NAME = "gemini-2.5-flash-lite"
+EMBEDDING_MODEL_NAME = "models/embedding-001"
+IMAGEN_MODEL_NAME = "imagegeneration@006"
+
+WARM_LLM_TEMPERATURES = (0.0, 0.2, 0.4)
+
+_clients: dict = {}
+_client_stats: dict = {}
+_creation_locks: dict = {}
+_registry_lock = threading.Lock()
+
+def _get_or_create(key: tuple, factory):
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is None:
+            creation_lock = _creation_locks.setdefault(key, threading.Lock())
+        else:
+            _client_stats[key]["uses"] += 1
+            return client
+    
+    # Build outside the registry lock: creating one client (e.g. Imagen's
+    # vertexai.init) must not hold up lookups of clients that already exist.
+    with creation_lock:
+        client = _clients.get(key)
+        if client is None:
+            start_time = time.perf_counter()
+            client = factory()
+            with _registry_lock:
+                _clients[key] = client
+                _client_stats[key] = {
+                    "created_at": time.time(),
+                    "init_ms": int((time.perf_counter() - start_time) * 1000),
+                    "uses": 0,
+                }
+    
+    with _registry_lock:
+        _client_stats[key]["uses"] += 1
+    return client
+
 def get_llm(temperature: float = 0.2) -> ChatGoogleGenerativeAI:
     if not settings.GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY not found in settings.")
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite", 
-        temperature=temperature,
-        google_api_key=settings.GOOGLE_API_KEY
-    )
+    
+    def create_llm():
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model=LLM_MODEL_NAME, 
+            temperature=temperature,
+            google_api_key=settings.GOOGLE_API_KEY
+        )
+    
+    return _get_or_create(("llm", LLM_MODEL_NAME, float(temperature)), create_llm)
 
-def get_embedding_model() -> GoogleGenerativeAIEmbeddings:
+def _create_google_embeddings() -> GoogleGenerativeAIEmbeddings:
     if not settings.GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY not found in settings.")
+    if not settings.OPENAI_API_KEY:
+        raise ValueError("OpenAI API key is invalid.")
+    
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
     return GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
+        model=EMBEDDING_MODEL_NAME,
         google_api_key=settings.GOOGLE_API_KEY
     )
+
+def _create_local_embeddings() -> HashingEmbeddings:
+    from .local_embeddings import HashingEmbeddings
+    return HashingEmbeddings(dimensions=settings.LOCAL_EMBEDDING_DIMENSIONS)
+
+# Embedding backends by EMBEDDING_BACKEND value: (model name, factory). Every
+# backend exposes the LangChain Embeddings interface.
+EMBEDDING_BACKENDS = {
+    "google": (lambda: EMBEDDING_MODEL_NAME, _create_google_embeddings),
+    "local": (lambda: f"local-hashing-{settings.LOCAL_EMBEDDING_DIMENSIONS}", _create_local_embeddings),
+}
+
+def _embedding_backend() -> tuple:
+    backend = EMBEDDING_BACKENDS.get(settings.EMBEDDING_BACKEND)
+    if backend is None:
+        raise ValueError(
+            f"Unknown EMBEDDING_BACKEND '{settings.EMBEDDING_BACKEND}'. "
+            f"Expected one of: {', '.join(EMBEDDING_BACKENDS)}."
+        )
+    return backend
+
+def get_embedding_model_name() -> str:
+    """Name of the active embedding model, used to key cached vectors."""
+    return _embedding_backend()[0]()
+
+def get_embedding_model() -> GoogleGenerativeAIEmbeddings | HashingEmbeddings:
+    name_fn, factory = _embedding_backend()
+    return _get_or_create(("embedding", name_fn()), factory)
     
 def get_imagen_model() -> ImageGenerationModel:
     if not settings.GCP_PROJECT or not settings.GCP_LOCATION:
         raise ValueError("GCP_PROJECT and GCP_LOCATION must be set for image generation.")
     
-    vertexai.init(project=settings.GCP_PROJECT, location=settings.GCP_LOCATION)
+    def create_imagen_model():
+        import vertexai
+        from vertexai.vision_models import ImageGenerationModel
+
+        vertexai.init(project=settings.GCP_PROJECT, location=settings.GCP_LOCATION)
+        return ImageGenerationModel.from_pretrained(IMAGEN_MODEL_NAME)
+    
+    return _get_or_create(
+        ("imagen", IMAGEN_MODEL_NAME, settings.GCP_PROJECT, settings.GCP_LOCATION),
+        create_imagen_model
+    )
+
+def warm_up_clients() -> dict:
+    factories = {f"llm@{t}": (lambda t=t: get_llm(temperature=t)) for t in WARM_LLM_TEMPERATURES}
+    factories["embedding"] = get_embedding_model
+    factories["imagen"] = get_imagen_model
     
-    model = ImageGenerationModel.from_pretrained("imagegeneration@006")
-    return model
\ No newline at end of file
+    failures = {}
+    for name, factory in factories.items():
+        try:
+            factory()
+        except Exception as e:
+            failures[name] = str(e)
+            print(f"Could not warm up {name} client: {e}")
+    return failures
+
+def get_client_stats() -> dict:
+    """Creation time, init cost and use count of each registered client.
+
+    The Google SDKs do not expose their HTTP connection pools, so these are
+    registry figures rather than pool sizes.
+    """
+    with _registry_lock:
+        return {
+            ":".join(str(part) for part in key): dict(stats)
+            for key, stats in _client_stats.items()
+        }
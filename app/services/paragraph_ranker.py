@@ -0,0 +1,86 @@
+import math
+import re
+
+# Words that usually signal something an illustrator could draw.
+SENSORY_WORDS = {
+    # sight
+    "red", "orange", "yellow", "green", "blue", "purple", "pink", "white", "black", "grey", "gray",
+    "golden", "silver", "crimson", "turquoise", "bright", "dark", "glowing", "shimmering", "sparkling",
+    "shadow", "shadows", "light", "sunlight", "moonlight", "sunset", "sunrise", "dawn", "dusk", "colorful",
+    "vivid", "misty", "foggy", "hazy", "glittering", "pale", "shiny",
+    # sound
+    "loud", "quiet", "silent", "buzzing", "humming", "roar", "roaring", "whisper", "whispering", "crash",
+    "crashing", "chirping", "rustling", "echo", "echoing", "music", "laughter", "thunder",
+    # smell and taste
+    "smell", "scent", "aroma", "fragrant", "salty", "sweet", "bitter", "sour", "spicy", "taste", "smoky",
+    # touch and temperature
+    "warm", "warmth", "cold", "chilly", "hot", "cool", "soft", "rough", "smooth", "wet", "damp", "sticky",
+    "breeze", "wind", "icy", "sandy", "dusty",
+}
+
+CONCRETE_NOUNS = {
+    # nature and weather
+    "beach", "ocean", "sea", "sand", "wave", "waves", "river", "lake", "mountain", "mountains", "hill",
+    "forest", "tree", "trees", "leaves", "flower", "flowers", "garden", "field", "sky", "cloud", "clouds",
+    "rain", "snow", "sun", "moon", "stars", "grass", "rock", "rocks", "island", "waterfall", "desert",
+    "jungle", "rice", "bird", "birds", "dog", "cat", "horse", "fish",
+    # places and buildings
+    "street", "road", "city", "village", "town", "house", "home", "room", "kitchen", "window", "door",
+    "bridge", "temple", "church", "market", "cafe", "restaurant", "park", "station", "train", "bus",
+    "car", "boat", "ship", "plane", "airport", "hotel", "balcony", "roof", "porch", "bench", "table",
+    # objects and people
+    "coffee", "tea", "cup", "book", "candle", "lamp", "fire", "campfire", "guitar", "camera", "bicycle",
+    "bike", "hat", "dress", "scarf", "umbrella", "kite", "blanket", "bread", "cake", "plate", "painting",
+    "child", "children", "friends", "crowd", "mother", "father", "grandmother", "grandfather", "face",
+    "hands", "eyes", "hair", "smile",
+}
+
+ABSTRACT_WORDS = {
+    "think", "thought", "thoughts", "feel", "feeling", "felt", "realize", "realized", "believe", "maybe",
+    "perhaps", "because", "reason", "idea", "ideas", "meaning", "decide", "decided", "understand",
+    "wonder", "lesson", "future", "plan", "plans", "goal", "goals", "work", "job", "deadline",
+}
+
+WORD_PATTERN = re.compile(r"[a-z']+")
+
+def score_paragraph(paragraph: str) -> float:
+    """Score how concretely visual a paragraph is; higher is more illustrable."""
+    words = WORD_PATTERN.findall(paragraph.lower())
+    if not words:
+        return 0.0
+
+    sensory = sum(1 for word in words if word in SENSORY_WORDS)
+    concrete = sum(1 for word in words if word in CONCRETE_NOUNS)
+    abstract = sum(1 for word in words if word in ABSTRACT_WORDS)
+
+    density = (1.0 * sensory + 0.8 * concrete - 0.5 * abstract) / len(words)
+    # Very short paragraphs rarely carry a full scene; the bonus saturates around 60 words.
+    length_factor = min(1.0, math.log1p(len(words)) / math.log1p(60))
+    return max(0.0, density) * length_factor
+
+def rank_paragraphs(paragraphs: list[str]) -> list[tuple[int, float]]:
+    """Return ``(position, score)`` pairs, 1-based, best first."""
+    scored = [(i + 1, score_paragraph(p)) for i, p in enumerate(paragraphs)]
+    return sorted(scored, key=lambda item: (-item[1], item[0]))
+
+def shortlist_paragraphs(
+    paragraphs: list[str],
+    max_candidates: int,
+    confidence_margin: float,
+    min_score: float = 0.05,
+) -> list[int]:
+    """Return candidate positions in document order.
+
+    A single position means the choice is clear enough to skip the LLM:
+    either there is only one paragraph, or the best paragraph scores at
+    least ``confidence_margin`` times the runner-up.
+    """
+    ranked = rank_paragraphs(paragraphs)
+    if len(ranked) <= 1:
+        return [position for position, _ in ranked]
+
+    (best_position, best_score), (_, runner_up_score) = ranked[0], ranked[1]
+    if best_score >= min_score and best_score >= confidence_margin * runner_up_score:
+        return [best_position]
+
+    return sorted(position for position, _ in ranked[:max(2, max_candidates)])
@@ -1,6 +1,15 @@
-from typing import Dict, Set
+import asyncio
+import json
+import weakref
+import zlib
+from contextlib import asynccontextmanager
+from typing import Set
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
+from ..cache.lru import LRUCache
+from ..cache.sqlite_store import SQLiteStore
+from ..config import settings
 from .memory_service import StructuredJournalHistory
 
 class UserSession(BaseModel):
@@ -9,10 +18,143 @@ class UserSession(BaseModel):
 
     class Config:
         arbitrary_types_allowed = True
-        
-SESSIONS: Dict[str, UserSession] = {}
+
+def serialize_session(session: UserSession) -> bytes:
+    data = {
+        "history": session.chat_history.to_dict(),
+        "excluded_highlights": sorted(session.excluded_highlights),
+    }
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+def deserialize_session(raw: bytes) -> UserSession:
+    data = json.loads(zlib.decompress(raw).decode("utf-8"))
+    return UserSession(
+        chat_history=StructuredJournalHistory.from_dict(data.get("history", {})),
+        excluded_highlights=set(data.get("excluded_highlights", [])),
+    )
+
+class MemorySessionBackend:
+    """Serialized sessions in a per-process LRU bounded by idle TTL and bytes."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self._cache = LRUCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl_seconds=ttl_seconds,
+            sizeof=lambda item: len(item) if isinstance(item, bytes) else 64,
+        )
+
+    def load(self, uuid: str):
+        return self._cache.get(uuid, refresh_ttl=True)
+
+    def store(self, uuid: str, raw: bytes):
+        self._cache.set(uuid, raw)
+
+    def delete(self, uuid: str):
+        self._cache.pop(uuid)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+class SQLiteSessionBackend:
+    """Sessions in a local SQLite file, shared by all workers on the host."""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._store = SQLiteStore(path, table="sessions", max_entries=max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, uuid: str):
+        raw = self._store.get(uuid, refresh_ttl_seconds=self.ttl_seconds)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bytes(raw)
+
+    def store(self, uuid: str, raw: bytes):
+        self._store.set(uuid, raw, ttl_seconds=self.ttl_seconds)
+
+    def delete(self, uuid: str):
+        self._store.delete(uuid)
+
+    def stats(self) -> dict:
+        return {
+            "entries": self._store.count(),
+            "max_entries": self._store.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self._store.evictions,
+            "expirations": self._store.expirations,
+        }
+
+def create_session_backend():
+    if settings.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionBackend(
+            settings.SESSION_DB_PATH,
+            max_entries=settings.SESSION_MAX_ENTRIES,
+            ttl_seconds=settings.SESSION_TTL_SECONDS,
+        )
+    if settings.SESSION_BACKEND != "memory":
+        print(f"Unknown SESSION_BACKEND '{settings.SESSION_BACKEND}', using in-memory sessions.")
+    return MemorySessionBackend(
+        max_entries=settings.SESSION_MAX_ENTRIES,
+        max_bytes=int(settings.SESSION_MAX_MB * 1024 * 1024),
+        ttl_seconds=settings.SESSION_TTL_SECONDS,
+    )
+
+session_backend = create_session_backend()
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
 
 def get_session(uuid: str) -> UserSession:
-    if uuid not in SESSIONS:
-        SESSIONS[uuid] = UserSession()
-    return SESSIONS[uuid]
\ No newline at end of file
+    raw = session_backend.load(uuid)
+    if raw is None:
+        return UserSession()
+
+    try:
+        return deserialize_session(raw)
+    except Exception as e:
+        print(f"Discarding unreadable session {uuid}: {e}")
+        session_backend.delete(uuid)
+        return UserSession()
+
+def save_session(uuid: str, session: UserSession):
+    session_backend.store(uuid, serialize_session(session))
+
+async def _run_backend(fn, *args):
+    if session_backend.blocking:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+async def aget_session(uuid: str) -> UserSession:
+    return await _run_backend(get_session, uuid)
+
+async def asave_session(uuid: str, session: UserSession):
+    await _run_backend(save_session, uuid, session)
+
+@asynccontextmanager
+async def locked_session(uuid: str):
+    """Load a session while holding its per-uuid lock.
+
+    Sessions are loaded as copies, so concurrent requests for the same uuid
+    are serialized from load to save instead of overwriting each other.
+    """
+    lock = _session_locks.get(uuid)
+    if lock is None:
+        lock = asyncio.Lock()
+        _session_locks[uuid] = lock
+    async with lock:
+        yield await aget_session(uuid)
+
+def get_session_stats() -> dict:
+    stats = session_backend.stats()
+    stats["backend"] = session_backend.name
+    stats["ttl_seconds"] = settings.SESSION_TTL_SECONDS
+    return stats
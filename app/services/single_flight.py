@@ -0,0 +1,55 @@
+import asyncio
+import hashlib
+import json
+import weakref
+
+from pydantic import BaseModel
+
+def canonical_key(payload: BaseModel) -> str:
+    data = payload.model_dump(mode="json")
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one in-flight computation.
+
+    The computation runs as its own task, so a caller that goes away does not
+    cancel it for the callers still waiting on it.
+    """
+
+    def __init__(self):
+        self._calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, async_fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+
+        task = calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(async_fn(*args, **kwargs))
+        calls[key] = task
+        task.add_done_callback(lambda _: calls.pop(key, None))
+        task.add_done_callback(_consume_exception)
+        self.executed += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return sum(len(calls) for calls in self._calls.values())
+
+    def stats(self) -> dict:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+        }
+
+def _consume_exception(task: asyncio.Task):
+    # Avoid "exception was never retrieved" when every waiter went away.
+    if not task.cancelled():
+        task.exception()
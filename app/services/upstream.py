@@ -0,0 +1,69 @@
+import asyncio
+import functools
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+
+from ..config import settings
+from ..logutils.metrics import record_upstream
+
+UPSTREAM_LIMITS = {
+    "llm": settings.LLM_MAX_CONCURRENCY,
+    "embedding": settings.EMBEDDING_MAX_CONCURRENCY,
+    "imagen": settings.IMAGEN_MAX_CONCURRENCY,
+    "gcs": settings.GCS_MAX_CONCURRENCY,
+}
+
+blocking_executor = ThreadPoolExecutor(
+    max_workers=settings.BLOCKING_IO_THREADS,
+    thread_name_prefix="upstream"
+)
+
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+def limit(upstream: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    loop_semaphores = _semaphores.setdefault(loop, {})
+    semaphore = loop_semaphores.get(upstream)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, UPSTREAM_LIMITS.get(upstream, 1)))
+        loop_semaphores[upstream] = semaphore
+    return semaphore
+
+async def call(upstream: str, async_fn, *args, **kwargs):
+    async with limit(upstream):
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await async_fn(*args, **kwargs)
+            outcome = "success"
+            return result
+        finally:
+            record_upstream(upstream, time.perf_counter() - start_time, outcome)
+
+async def stream(upstream: str, async_iter_fn, *args, **kwargs):
+    """Yield from an async iterator while holding one slot of ``upstream``."""
+    async with limit(upstream):
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            async with aclosing(async_iter_fn(*args, **kwargs)) as items:
+                async for item in items:
+                    yield item
+            outcome = "success"
+        except GeneratorExit:
+            outcome = "cancelled"
+            raise
+        finally:
+            record_upstream(upstream, time.perf_counter() - start_time, outcome)
+
+async def run_blocking(upstream: str, fn, *args, **kwargs):
+    return await call(upstream, _run_in_executor, functools.partial(fn, *args, **kwargs))
+
+async def _run_in_executor(fn):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, fn)
+
+def shutdown():
+    blocking_executor.shutdown(wait=False, cancel_futures=True)
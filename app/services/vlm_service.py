@@ -1,48 +1,97 @@
-from langchain_openai import ChatOpenAI
+import asyncio
+import hashlib
 from langchain_core.messages import HumanMessage, SystemMessage
-from app.cloud.storage_client import load_image, pil_image_to_data_url
+from app.cloud.storage_client import blob_identity, get_blob_with_metadata, prepare_blob_data_url
+from ..cache.lru import LRUCache
+from ..cache.tiered import TieredCache
 from ..schemas import ImageContext
 from ..config import settings
-import base64
+from ..logutils.metrics import instrument
 from . import model_provider
+from . import upstream
 
-def generate_image_descriptions(images: list[ImageContext]) -> list[dict]:
+DESCRIPTION_SYSTEM_PROMPT = "You are an assistant that describes images for emotion analysis."
+DESCRIPTION_USER_PROMPT = "Describe the key emotional cues in this image."
+
+description_cache = TieredCache(
+    LRUCache(max_entries=settings.VLM_CACHE_MAX_ENTRIES),
+    disk_path=settings.VLM_CACHE_DISK_PATH or None,
+    table="vlm_descriptions",
+    disk_max_entries=settings.VLM_CACHE_MAX_ENTRIES * 10,
+    ttl_seconds=settings.VLM_CACHE_TTL_SECONDS,
+)
+
+@instrument("vlm.generate_image_descriptions")
+async def agenerate_image_descriptions(images: list[ImageContext]) -> list[dict]:
     if not images:
         return []
 
+    _check_settings()
+
+    llm = model_provider.get_llm()
+    semaphore = asyncio.Semaphore(max(1, settings.VLM_MAX_CONCURRENT_IMAGES))
+
+    async def describe(image: ImageContext) -> dict:
+        async with semaphore:
+            try:
+                blob = await upstream.run_blocking("gcs", _get_image_blob, image)
+                key = _description_cache_key(blob)
+                description = await description_cache.aget(key)
+                if description is None:
+                    data_url = await upstream.run_blocking("gcs", prepare_blob_data_url, blob)
+                    response = await upstream.call("llm", llm.ainvoke, _build_description_prompt(data_url))
+                    description = await description_cache.aset(key, response.content.strip())
+                return _to_description(image, description)
+            except Exception as e:
+                return _to_failure(image, e)
+
+    descriptions = await asyncio.gather(*(describe(image) for image in images))
+
+    return _order_by_position(descriptions)
+
+def get_description_cache_stats() -> dict:
+    return description_cache.stats()
+
+def _check_settings():
     if not settings.GOOGLE_API_KEY:
         raise RuntimeError("GOOGLE_API_KEY is required for image description generation.")
 
-    llm = model_provider.get_llm()
-    descriptions: list[dict] = []
-
-    for image in images:
-        if not image.url.startswith("https://storage.googleapis.com"):
-            raise ValueError("Image URL must point to https://storage.googleapis.com")
-
-        pil_image = load_image(image.url)
-        data_url = pil_image_to_data_url(
-            pil_image,
-            image.format,
-            getattr(image, "encoding", None),
-        )
-
-        prompt = [
-            SystemMessage(content="You are an assistant that describes images for emotion analysis."),
-            HumanMessage(
-                content=[
-                    {"type": "text", "text": "Describe the key emotional cues in this image."},
-                    {"type": "image_url", "image_url": {"url": data_url}},
-                ]
-            ),
-        ]
-        response = llm.invoke(prompt)
-
-        descriptions.append(
-            {
-                "description": response.content.strip(),
-                "position": image.position_after_paragraph,
-            }
-        )
-
-    return descriptions
\ No newline at end of file
+def _get_image_blob(image: ImageContext):
+    if not image.url.startswith("https://storage.googleapis.com"):
+        raise ValueError("Image URL must point to https://storage.googleapis.com")
+
+    return get_blob_with_metadata(image.url)
+
+def _description_cache_key(blob) -> str:
+    prompt_version = hashlib.sha256(
+        f"{DESCRIPTION_SYSTEM_PROMPT}\0{DESCRIPTION_USER_PROMPT}".encode("utf-8")
+    ).hexdigest()[:12]
+    return f"{model_provider.LLM_MODEL_NAME}:{prompt_version}:{blob_identity(blob)}"
+
+def _build_description_prompt(data_url: str) -> list:
+    return [
+        SystemMessage(content=DESCRIPTION_SYSTEM_PROMPT),
+        HumanMessage(
+            content=[
+                {"type": "text", "text": DESCRIPTION_USER_PROMPT},
+                {"type": "image_url", "image_url": {"url": data_url}},
+            ]
+        ),
+    ]
+
+def _to_description(image: ImageContext, description: str) -> dict:
+    return {
+        "description": description,
+        "position": image.position_after_paragraph,
+    }
+
+def _to_failure(image: ImageContext, error: Exception) -> dict:
+    print(f"Error describing image {image.url}: {error}")
+    return {
+        "url": image.url,
+        "position": image.position_after_paragraph,
+        "error": str(error),
+    }
+
+def _order_by_position(descriptions: list[dict]) -> list[dict]:
+    return sorted(descriptions, key=lambda x: x["position"])
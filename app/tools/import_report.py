@@ -0,0 +1,56 @@
+"""Report how long importing a module takes, broken down by dependency.
+
+Usage: python -m app.tools.import_report [module] [--top N]
+"""
+import argparse
+import subprocess
+import sys
+
+def collect_import_times(module: str) -> list[tuple[str, int, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        tail = "\n".join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"Importing {module} failed:\n{tail}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+    return timings
+
+def summarize_by_package(timings: list[tuple[str, int, int]]) -> dict[str, int]:
+    totals: dict[str, int] = {}
+    for name, self_us, _ in timings:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("module", nargs="?", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    timings = collect_import_times(args.module)
+    total_us = sum(self_us for _, self_us, _ in timings)
+
+    print(f"Importing {args.module}: {total_us / 1000:.1f} ms across {len(timings)} modules\n")
+
+    print("By top-level package (self time):")
+    packages = sorted(summarize_by_package(timings).items(), key=lambda item: item[1], reverse=True)
+    for package, self_us in packages[:args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {package}")
+
+    print("\nApplication modules (cumulative time):")
+    for name, _, cumulative_us in timings:
+        if name == args.module or name.startswith("app."):
+            print(f"  {cumulative_us / 1000:9.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()